@@ -2,58 +2,62 @@
 API Endpoint para actualización automática de feeds RSS
 Puede ser llamado desde cron-job.org o servicios similares
 """
-import sqlite3
-import feedparser
 from datetime import datetime
 import hashlib
-import re
 from bs4 import BeautifulSoup
-from deep_translator import GoogleTranslator
 import sys
 import os
+from classification import KeywordMatcher
+from feed_fetcher import ConcurrentFeedFetcher
+from ioc_extraction import IOCExtractor
+from database import CTIDatabase, ScanLock
+from db_pool import connect
+from dedup import KnownArticleFilter
+from scheduler import PollScheduler
+from translation import TranslationWorker, get_translation_engine
 
 # Configuración
 DB_PATH = "cti_platform.db"
 API_TOKEN = os.getenv("API_TOKEN", "cti-api-secret-2025")  # Cambiar en producción
 
-class IOCExtractor:
-    """Extractor de Indicadores de Compromiso"""
-    
-    def __init__(self):
-        self.patterns = {
-            'ip': r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b',
-            'domain': r'\b(?:[a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}\b',
-            'cve': r'CVE-\d{4}-\d{4,7}',
-            'md5': r'\b[a-fA-F0-9]{32}\b',
-            'sha256': r'\b[a-fA-F0-9]{64}\b',
-        }
-    
-    def extract_iocs(self, text: str) -> list:
-        """Extrae todos los IOCs del texto"""
-        iocs = []
-        for ioc_type, pattern in self.patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            iocs.extend(matches)
-        return list(set(iocs))
+# Filtrado de contenido: listas de palabras clave preparadas una sola vez
+EXCLUDED_KEYWORDS = KeywordMatcher([
+    'virtual event', 'webinar', 'register now', 'view agenda',
+    'conference', 'summit', 'outlook', 'predictions', 'rsvp',
+    'join us', 'save the date', 'live event', 'registration',
+    'upcoming event', 'event details'
+])
+RELEVANT_KEYWORDS = KeywordMatcher([
+    'vulnerability', 'exploit', 'breach', 'malware', 'ransomware',
+    'cve', 'zero-day', 'patch', 'trojan', 'apt', 'phishing',
+    'backdoor', 'botnet', 'ddos', 'attack', 'threat', 'campaign',
+    'cybersecurity', 'security', 'hacker', 'data leak', 'compromise'
+])
 
 class RSSUpdater:
     """Actualiza feeds RSS automáticamente"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, max_workers: int = None, per_host_limit: int = None):
         self.db_path = db_path
         self.ioc_extractor = IOCExtractor()
-        self.translator = GoogleTranslator(source='auto', target='es')
+        self.fetcher = ConcurrentFeedFetcher(max_workers=max_workers, per_host_limit=per_host_limit)
+        self.known_filter = KnownArticleFilter(self.create_fingerprint)
+        self.translation_cache = get_translation_engine(db_path).cache
+        self.translation_worker = TranslationWorker(db_path)
+        self.scheduler = PollScheduler(db_path)
+        # Aplica las migraciones de esquema (columnas de traducción, validadores HTTP)
+        self.db = CTIDatabase(db_path)
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        return connect(self.db_path)
     
     def create_fingerprint(self, title: str, url: str) -> str:
         """Crea fingerprint único para evitar duplicados"""
         content = f"{title}{url}".lower()
         return hashlib.sha256(content.encode()).hexdigest()
     
-    def process_entry(self, source_id: int, entry: dict) -> tuple:
-        """Procesa una entrada RSS y la guarda en la DB"""
+    def build_article(self, source_id: int, entry: dict) -> tuple:
+        """Prepara la fila de una entrada RSS. Retorna (article_data, None) o (None, motivo)"""
         try:
             title = entry.get('title', 'Sin título')
             link = entry.get('link', '')
@@ -64,40 +68,14 @@ class RSSUpdater:
             content = soup.get_text()
             
             # Filtrado de contenido
-            excluded_keywords = [
-                'virtual event', 'webinar', 'register now', 'view agenda',
-                'conference', 'summit', 'outlook', 'predictions', 'rsvp',
-                'join us', 'save the date', 'live event', 'registration',
-                'upcoming event', 'event details'
-            ]
-            
             content_lower = content.lower()
-            for keyword in excluded_keywords:
-                if keyword in content_lower or keyword in title.lower():
-                    return False, f"Filtrado: evento/anuncio ({keyword})"
+            keyword = EXCLUDED_KEYWORDS.first_match(content_lower, title.lower())
+            if keyword:
+                return None, f"Filtrado: evento/anuncio ({keyword})"
             
             # Validar contenido de seguridad
-            if len(content) > 50:
-                relevant_keywords = [
-                    'vulnerability', 'exploit', 'breach', 'malware', 'ransomware',
-                    'cve', 'zero-day', 'patch', 'trojan', 'apt', 'phishing',
-                    'backdoor', 'botnet', 'ddos', 'attack', 'threat', 'campaign',
-                    'cybersecurity', 'security', 'hacker', 'data leak', 'compromise'
-                ]
-                
-                has_relevant = any(kw in content_lower for kw in relevant_keywords)
-                if not has_relevant:
-                    return False, "Filtrado: sin contenido relevante de seguridad"
-            
-            # Traducir a español
-            try:
-                title_es = self.translator.translate(title[:500])
-                summary_es = self.translator.translate(summary[:1000]) if summary else ""
-                content_es = self.translator.translate(content[:2000]) if len(content) > 100 else content
-            except:
-                title_es = title
-                summary_es = summary
-                content_es = content
+            if len(content) > 50 and not RELEVANT_KEYWORDS.matches(content_lower):
+                return None, "Filtrado: sin contenido relevante de seguridad"
             
             # Fecha de publicación
             published = entry.get('published_parsed', entry.get('updated_parsed', None))
@@ -110,7 +88,7 @@ class RSSUpdater:
                 now = datetime.now(timezone(timedelta(hours=-5)))
                 max_date = now + timedelta(days=1)
                 if published > max_date:
-                    return False, f"Fecha futura rechazada: {published.strftime('%Y-%m-%d')}"
+                    return None, f"Fecha futura rechazada: {published.strftime('%Y-%m-%d')}"
             else:
                 published = datetime.now()
             
@@ -127,57 +105,101 @@ class RSSUpdater:
                 tags.append('iocs')
             tags_str = ','.join(tags)
             
-            # Guardar en DB
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            try:
-                cursor.execute("""
-                    INSERT INTO articles (source_id, title, summary, content, url, published_at, fingerprint, iocs, tags)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (source_id, title_es, summary_es, content_es, link, published, fingerprint, iocs_str, tags_str))
-                conn.commit()
-                conn.close()
-                return True, title_es
-            except sqlite3.IntegrityError:
-                conn.close()
-                return False, "Duplicado"
+            return (source_id, title, summary[:1000], content[:2000], link, published,
+                    fingerprint, iocs_str, tags_str), None
                 
         except Exception as e:
-            return False, str(e)
+            return None, str(e)
+    
+    def process_entries(self, source_id: int, entries: list) -> int:
+        """Guarda las entradas de un feed en una sola transacción. Retorna artículos nuevos"""
+        articles = []
+        for entry in entries:
+            article_data, _ = self.build_article(source_id, entry)
+            if article_data:
+                articles.append(article_data)
+        
+        # En idioma original; se traduce al final del escaneo
+        outcomes = self.db.add_articles(articles, translation_status='pending')
+        for article_data, inserted in zip(articles, outcomes):
+            if inserted:
+                self.known_filter.mark_known(article_data[4], article_data[6])
+        return sum(outcomes)
+    
+    def update_all_feeds(self, max_per_source: int = 50, force: bool = False) -> dict:
+        """Actualiza los feeds RSS cuya próxima consulta ya venció (todos con `force`).
+        
+        Si otro proceso (p. ej. ingest_daemon.py) está escaneando, no hace nada.
+        """
+        lock = ScanLock(self.db_path)
+        if not lock.acquire():
+            return {'skipped': True}
+        try:
+            return self._update_all_feeds(max_per_source, force)
+        finally:
+            lock.release()
     
-    def update_all_feeds(self, max_per_source: int = 50) -> dict:
-        """Actualiza todos los feeds RSS configurados"""
+    def _update_all_feeds(self, max_per_source: int, force: bool) -> dict:
         conn = self.get_connection()
         cursor = conn.cursor()
         
         # Obtener todas las fuentes configuradas
-        cursor.execute("SELECT id, name, url FROM sources")
-        sources = cursor.fetchall()
+        cursor.execute("SELECT id, name, url, etag, last_modified, content_hash, next_fetch_at FROM sources")
+        all_sources = cursor.fetchall()
         conn.close()
         
+        # Solo las fuentes que tocan según la planificación adaptativa;
+        # las que tienen el circuito abierto se omiten incluso con `force`
+        now = datetime.now().timestamp()
+        paused = self.scheduler.open_circuits(now)
+        sources = [source[:6] for source in all_sources
+                   if source[0] not in paused and (force or source[6] is None or source[6] <= now)]
+        
+        self.translation_cache.reset_stats()
         results = {
             'total_sources': len(sources),
+            'sources_not_due': len(all_sources) - len(sources),
             'total_new': 0,
+            'total_skipped_known': 0,
+            'sources_not_modified': 0,
             'sources_updated': []
         }
         
-        for source_id, name, url in sources:
+        names = {source[0]: source[1] for source in sources}
+        
+        # Descarga concurrente con GET condicional; cada feed se procesa a medida que llega
+        for source_id, result in self.fetcher.fetch_all(
+            (source_id, url, {'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash})
+            for source_id, _, url, etag, last_modified, content_hash in sources
+        ):
+            name = names[source_id]
+            error = None
             try:
-                feed = feedparser.parse(url)
-                entries = feed.entries[:max_per_source]
+                if result.status == 'error':
+                    raise RuntimeError(result.error)
+                if result.skipped:
+                    results['sources_not_modified'] += 1
+                entries = [] if result.skipped else result.feed.entries[:max_per_source]
                 
-                new_count = 0
-                for entry in entries:
-                    added, _ = self.process_entry(source_id, entry)
-                    if added:
-                        new_count += 1
+                # Descartar entradas ya almacenadas antes de traducir
+                conn = self.get_connection()
+                try:
+                    new_entries = self.known_filter.filter_new(conn, entries)
+                finally:
+                    conn.close()
+                results['total_skipped_known'] += len(entries) - len(new_entries)
+                entries = new_entries
                 
-                # Actualizar timestamp de la fuente
+                new_count = self.process_entries(source_id, entries)
+                
+                # Actualizar timestamp y validadores HTTP de la fuente
                 conn = self.get_connection()
                 cursor = conn.cursor()
-                cursor.execute("UPDATE sources SET last_fetched = ? WHERE id = ?", 
-                             (datetime.now(), source_id))
+                cursor.execute(
+                    "UPDATE sources SET last_fetched = ?, etag = ?, last_modified = ?, "
+                    "content_hash = ? WHERE id = ?",
+                    (datetime.now(), result.etag, result.last_modified, result.content_hash, source_id)
+                )
                 conn.commit()
                 conn.close()
                 
@@ -188,11 +210,18 @@ class RSSUpdater:
                 })
                 
             except Exception as e:
+                error = str(e)
                 results['sources_updated'].append({
                     'name': name,
-                    'error': str(e)
+                    'error': error
                 })
+            finally:
+                self.scheduler.record_result(source_id, result.latency, error)
         
+        # Traducir los artículos insertados (y pendientes de escaneos anteriores)
+        results['translated'] = self.translation_worker.drain()
+        results['translation_pending'] = self.translation_worker.pending_count()
+        results['translation_cache'] = self.translation_cache.stats_summary()
         return results
 
 def main():
@@ -213,9 +242,19 @@ def main():
     updater = RSSUpdater(DB_PATH)
     results = updater.update_all_feeds()
     
+    if results.get('skipped'):
+        print("⏭️  Otro proceso está escaneando los feeds; no se hizo nada")
+        sys.exit(0)
+    
     print(f"✅ Actualización completada:")
-    print(f"   - Fuentes procesadas: {results['total_sources']}")
+    print(f"   - Fuentes procesadas: {results['total_sources']} "
+          f"({results['sources_not_due']} aún no tocaban)")
     print(f"   - Artículos nuevos: {results['total_new']}")
+    print(f"   - Entradas ya conocidas (omitidas): {results['total_skipped_known']}")
+    print(f"   - Fuentes sin cambios (no parseadas): {results['sources_not_modified']}")
+    print(f"   - Artículos traducidos: {results['translated']} "
+          f"({results['translation_pending']} pendientes)")
+    print(f"   - {results['translation_cache']}")
     
     for source in results['sources_updated']:
         if 'error' in source:
@@ -0,0 +1,197 @@
+"""
+Clasificación de amenazas por palabras clave
+La criticidad y el tipo se calculan al guardar el artículo y se persisten en `articles`
+"""
+import sqlite3
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class KeywordMatcher:
+    """Lista de palabras clave en minúsculas, preparada una sola vez.
+
+    La comparación es la de `keyword in text` (el texto debe venir ya en
+    minúsculas) y se detiene en la primera coincidencia. Con unas decenas
+    de palabras es más rápida que una alternancia compilada o un autómata
+    Aho-Corasick de una sola pasada: ver `python classification.py benchmark`.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(dict.fromkeys(keyword.lower() for keyword in keywords))
+
+    def matches(self, text: str) -> bool:
+        """¿Aparece alguna palabra clave?"""
+        return any(keyword in text for keyword in self.keywords)
+
+    def first_match(self, *texts: str) -> Optional[str]:
+        """Primera palabra clave (en el orden declarado) presente en alguno de los textos"""
+        return next((keyword for keyword in self.keywords if any(keyword in text for text in texts)), None)
+
+
+# Palabras clave por tipo y criticidad, en orden de prioridad
+THREAT_CLASSIFICATIONS = {
+    'critical': {
+        'types': ['Ransomware', 'Zero-Day', 'RCE', 'Vulnerabilidad Crítica'],
+        'keywords': ['ransomware', 'zero-day', 'zero day', 'rce', 'remote code execution',
+                    'critical vulnerability', 'actively exploited', 'exploit in the wild',
+                    'vulnerabilidad crítica', 'explotación activa', '0-day']
+    },
+    'high': {
+        'types': ['Malware', 'APT', 'Data Breach', 'Ataque Dirigido'],
+        'keywords': ['malware', 'apt', 'advanced persistent', 'data breach', 'hack',
+                    'breach', 'compromise', 'attack campaign', 'trojan', 'backdoor',
+                    'filtración', 'violación de datos', 'compromiso', 'troyano']
+    },
+    'medium': {
+        'types': ['Phishing', 'Vulnerabilidad', 'Exploit', 'Botnet'],
+        'keywords': ['phishing', 'vulnerability', 'exploit', 'botnet', 'ddos',
+                    'denial of service', 'cve-', 'security flaw', 'weakness',
+                    'vulnerabilidad', 'debilidad de seguridad', 'suplantación']
+    },
+    'low': {
+        'types': ['Actualización', 'Parche', 'Advisory', 'Advertencia'],
+        'keywords': ['patch', 'update', 'advisory', 'warning', 'recommendation',
+                    'parche', 'actualización', 'recomendación', 'aviso']
+    }
+}
+
+# Por nivel: (criticidad, palabras clave, tipos con su forma en minúsculas)
+_TIERS = tuple(
+    (severity, KeywordMatcher(data['keywords']), tuple((t, t.lower()) for t in data['types']))
+    for severity, data in THREAT_CLASSIFICATIONS.items()
+)
+
+
+class ThreatClassifier:
+    @staticmethod
+    def classify_threat(title: str, content: str) -> Dict[str, str]:
+        """Clasifica la amenaza según palabras clave y retorna tipo y criticidad"""
+        text = f"{title} {content}".lower()
+        
+        # Determinar criticidad: el primer nivel con alguna coincidencia
+        for severity, keywords, types in _TIERS:
+            if keywords.matches(text):
+                # Intentar determinar tipo específico
+                for threat_type, lowered in types:
+                    if lowered in text:
+                        return {'severity': severity, 'type': threat_type}
+                # Si no encuentra tipo específico, usar el primero de la lista
+                return {'severity': severity, 'type': types[0][0]}
+        
+        # Por defecto: informativo
+        return {'severity': 'info', 'type': 'Información'}
+
+
+def classify_article(title: str, content: str, summary: str = None) -> Tuple[str, str]:
+    """(severity, threat_type) de un artículo; usa el resumen si no hay contenido"""
+    info = ThreatClassifier.classify_threat(title or '', (content if content else summary) or '')
+    return info['severity'], info['type']
+
+
+def ensure_classification_columns(conn: sqlite3.Connection):
+    """Agrega a `articles` las columnas severity / threat_type si faltan (índices: database.QUERY_INDEXES)"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(articles)")}
+    for column in ('severity', 'threat_type'):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE articles ADD COLUMN {column} TEXT")
+    conn.commit()
+
+
+def reclassify_articles(conn: sqlite3.Connection, only_missing: bool = True,
+                        batch_size: int = 1000) -> int:
+    """Recalcula severity / threat_type con las palabras clave actuales.
+
+    Con `only_missing` solo toca artículos sin clasificar (backfill tras la
+    migración); sin él reclasifica todo el corpus, p. ej. después de cambiar
+    las palabras clave de ThreatClassifier. Retorna cuántos se actualizaron.
+    """
+    where = "WHERE severity IS NULL" if only_missing else ""
+    updated, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, title, content, summary FROM articles {where} "
+            f"{'AND' if where else 'WHERE'} id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return updated
+        conn.executemany(
+            "UPDATE articles SET severity = ?, threat_type = ? WHERE id = ?",
+            [(*classify_article(title, content, summary), article_id)
+             for article_id, title, content, summary in rows]
+        )
+        conn.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+
+def _classify_hits(hits) -> Dict[str, str]:
+    """Misma regla que classify_threat, sobre el conjunto de palabras encontradas"""
+    for severity, keywords, types in _TIERS:
+        if not hits.isdisjoint(keywords.keywords):
+            for threat_type, lowered in types:
+                if lowered in hits:
+                    return {'severity': severity, 'type': threat_type}
+            return {'severity': severity, 'type': types[0][0]}
+    return {'severity': 'info', 'type': 'Información'}
+
+
+def benchmark(rounds: int = 2000, fixtures_path: str = "fixtures/articles.json"):
+    """Compara la búsqueda por subcadenas con matchers compilados de una sola pasada.
+
+    Candidatos: una alternancia precompilada (`re`, con lookahead para ver
+    palabras solapadas) y, si pyahocorasick está instalado, un autómata
+    Aho-Corasick. Se mide µs por clasificación en fixtures/articles.json,
+    con el texto tal cual y repetido 10 veces (cuerpos largos).
+    """
+    import json
+    import re
+    import time
+
+    words = sorted({keyword for _, matcher, _ in _TIERS for keyword in matcher.keywords}
+                   | {lowered for _, _, types in _TIERS for _, lowered in types}, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(word) for word in words) + "))")
+    candidates = {
+        'subcadenas': lambda text: ThreatClassifier.classify_threat(text, ''),
+        'regex': lambda text: _classify_hits({m.group(1) for m in pattern.finditer(text)}),
+    }
+    try:
+        import ahocorasick
+        automaton = ahocorasick.Automaton()
+        for word in words:
+            automaton.add_word(word, word)
+        automaton.make_automaton()
+        candidates['aho-corasick'] = lambda text: _classify_hits({word for _, word in automaton.iter(text)})
+    except ImportError:
+        print("(pyahocorasick no está instalado: se omite el autómata)")
+
+    def per_call_us(func, text):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func(text)
+        return (time.perf_counter() - start) / rounds * 1e6
+
+    with open(fixtures_path, encoding='utf-8') as f:
+        articles = json.load(f)
+    print(f"Artículos: {len(articles)} · rondas: {rounds} · µs por clasificación")
+    print("  " + " · ".join(f"{name:>12}" for name in candidates))
+    totals = dict.fromkeys(candidates, 0.0)
+    for article in articles:
+        for repeat in (1, 10):
+            text = f"{article['title']} {' '.join([article['content']] * repeat)}".lower()
+            expected = candidates['subcadenas'](text)
+            timings = []
+            for name, func in candidates.items():
+                elapsed = per_call_us(func, text)
+                totals[name] += elapsed
+                timings.append(f"{elapsed:12.1f}{'' if func(text) == expected else ' ≠'}")
+            print(f"  {' · '.join(timings)}   ({len(text)} car.)")
+    base = totals['subcadenas']
+    print("  Total: " + " · ".join(f"{name} {total:.1f} ({base / total:.2f}x)" for name, total in totals.items()))
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(*(int(a) for a in sys.argv[2:3]))
+    else:
+        print("Uso: python classification.py benchmark [RONDAS]")
@@ -0,0 +1,167 @@
+"""
+Agrupación de noticias casi duplicadas entre fuentes
+MinHash sobre título + contenido normalizados y LSH por bandas guardado en SQLite
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+import zlib
+from typing import List, Optional, Set
+
+import numpy as np
+
+from search_index import get_schema_version, set_schema_version
+
+# Configuración (sobrescribible por variables de entorno)
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.5"))   # Jaccard estimado
+NEAR_DUP_WINDOW_DAYS = int(os.getenv("NEAR_DUP_WINDOW_DAYS", "7"))   # "Patch Tuesday" de otro mes no es la misma historia
+
+# 16 bandas de 4 filas: dos artículos con Jaccard 0.5 comparten alguna
+# banda con ~64% de probabilidad, con 0.8 con ~100%
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+SHINGLE_CONTENT_CHARS = 2000   # api_endpoint.py guarda como mucho 2000 caracteres de contenido
+
+# Subir si cambian las permutaciones, las bandas o cómo se parte el texto: recalcula las firmas
+CLUSTER_INDEX_VERSION = 1
+
+_MERSENNE = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20251118)   # semilla fija: las firmas guardadas deben seguir valiendo
+_PERM_A = _rng.randint(1, int(_MERSENNE), size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, int(_MERSENNE), size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+
+def normalize_words(text: str) -> List[str]:
+    """Palabras en minúsculas, sin acentos ni HTML residual"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.findall(r"[a-z0-9]+", re.sub(r"<[^>]+>", " ", text))
+
+
+def shingles(title: str, content: str) -> Set[int]:
+    """Pares de palabras consecutivas (como crc32) de título + contenido"""
+    words = normalize_words(f"{title} {(content or '')[:SHINGLE_CONTENT_CHARS]}")
+    if len(words) < 2:
+        return {zlib.crc32(word.encode()) for word in words}
+    return {zlib.crc32(f"{a} {b}".encode()) for a, b in zip(words, words[1:])}
+
+
+def minhash_signature(title: str, content: str) -> Optional[np.ndarray]:
+    """Firma MinHash (uint32 × MINHASH_PERMUTATIONS); None si no hay texto"""
+    values = shingles(title, content)
+    if not values:
+        return None
+    x = np.fromiter(values, dtype=np.uint64, count=len(values)) % _MERSENNE
+    return ((np.outer(x, _PERM_A) + _PERM_B) % _MERSENNE).min(axis=0).astype(np.uint32)
+
+
+def band_buckets(signature: np.ndarray) -> List[int]:
+    """Una clave (entero de 64 bits con signo) por banda de la firma"""
+    return [
+        int.from_bytes(hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(),
+                                       digest_size=8).digest(), 'big', signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard estimado: fracción de permutaciones con el mismo mínimo"""
+    return float(np.mean(a == b))
+
+
+def ensure_cluster_tables(conn: sqlite3.Connection):
+    """Agrega `articles.cluster_id` y el índice LSH; la primera vez agrupa el corpus"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(articles)")}
+    if 'cluster_id' not in columns:
+        # id del artículo representante (el primero de la historia)
+        conn.execute("ALTER TABLE articles ADD COLUMN cluster_id INTEGER")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS article_minhash (
+        article_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS minhash_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        article_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, article_id)
+    ) WITHOUT ROWID
+    """)
+    if get_schema_version(conn, 'article_minhash') < CLUSTER_INDEX_VERSION:
+        rebuild_clusters(conn)
+        set_schema_version(conn, 'article_minhash', CLUSTER_INDEX_VERSION)
+    conn.commit()
+
+
+def assign_cluster(conn: sqlite3.Connection, article_id: int, title: str, content: str,
+                   published_ts: Optional[int]) -> int:
+    """Indexa un artículo y lo une a la historia más parecida (o abre una nueva).
+
+    Los candidatos salen de las bandas LSH compartidas; se elige el de mayor
+    similitud estimada que supere NEAR_DUP_THRESHOLD y esté publicado a
+    menos de NEAR_DUP_WINDOW_DAYS (por `published_ts`, epoch UTC; sin fecha
+    no hay ventana y el artículo abre su propia historia). Retorna el
+    cluster_id asignado. No hace commit.
+    """
+    signature = minhash_signature(title, content)
+    if signature is None:
+        conn.execute("UPDATE articles SET cluster_id = ? WHERE id = ?", (article_id, article_id))
+        return article_id
+    buckets = band_buckets(signature)
+
+    candidates = set()
+    for band, bucket in enumerate(buckets):
+        candidates.update(row[0] for row in conn.execute(
+            "SELECT article_id FROM minhash_bands WHERE band = ? AND bucket = ?", (band, bucket)
+        ))
+    candidates.discard(article_id)
+
+    cluster_id, best = article_id, NEAR_DUP_THRESHOLD
+    if candidates and published_ts is not None:
+        window = NEAR_DUP_WINDOW_DAYS * 86400
+        rows = conn.execute(
+            "SELECT a.id, COALESCE(a.cluster_id, a.id), m.signature FROM articles a "
+            "JOIN article_minhash m ON m.article_id = a.id "
+            f"WHERE a.id IN ({','.join('?' * len(candidates))}) "
+            "AND a.published_ts BETWEEN ? AND ?",
+            (*candidates, published_ts - window, published_ts + window)
+        ).fetchall()
+        for _, candidate_cluster, blob in rows:
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= best:
+                cluster_id, best = candidate_cluster, score
+
+    conn.execute("INSERT OR REPLACE INTO article_minhash (article_id, signature) VALUES (?, ?)",
+                 (article_id, signature.tobytes()))
+    conn.executemany("INSERT OR IGNORE INTO minhash_bands (band, bucket, article_id) VALUES (?, ?, ?)",
+                     [(band, bucket, article_id) for band, bucket in enumerate(buckets)])
+    conn.execute("UPDATE articles SET cluster_id = ? WHERE id = ?", (cluster_id, article_id))
+    return cluster_id
+
+
+def rebuild_clusters(conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+    """Vuelve a indexar y agrupar todo el corpus, del más antiguo al más nuevo"""
+    conn.execute("DELETE FROM article_minhash")
+    conn.execute("DELETE FROM minhash_bands")
+    conn.execute("UPDATE articles SET cluster_id = NULL")
+    processed, last_key = 0, (float('-inf'), 0)
+    while True:
+        # Recorrido por (published_ts, id): usa idx_articles_published_ts
+        rows = conn.execute(
+            "SELECT id, title, content, published_ts FROM articles "
+            "WHERE (published_ts, id) > (?, ?) ORDER BY published_ts, id LIMIT ?",
+            (*last_key, batch_size)
+        ).fetchall()
+        if not rows:
+            # Sin fecha no hay ventana con la que comparar: cada uno es su propia historia
+            conn.execute("UPDATE articles SET cluster_id = id WHERE cluster_id IS NULL")
+            return processed
+        for article_id, title, content, published_ts in rows:
+            assign_cluster(conn, article_id, title, content, published_ts)
+        processed += len(rows)
+        last_key = (rows[-1][3], rows[-1][0])
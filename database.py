@@ -0,0 +1,912 @@
+"""
+Acceso a la base de datos SQLite de la plataforma CTI
+Compartido por la app de Streamlit y el servicio de ingesta
+"""
+import os
+import re
+import socket
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from typing import Iterable, List
+
+import pandas as pd
+
+from classification import classify_article, ensure_classification_columns, reclassify_articles
+from clustering import assign_cluster, ensure_cluster_tables, rebuild_clusters
+from db_pool import connect
+from ioc_extraction import ensure_ioc_tables, extract, link_article_iocs, parse_stored_ioc, reextract_iocs
+from query_cache import ensure_data_generation, query_cache, read_generations
+from rollups import (LAST_INGEST_AT, TOTAL_ARTICLES, classification_counts, daily_counts, dashboard_totals,
+                     ensure_rollup_tables, ioc_type_counts, read_counter, source_counter, source_counts,
+                     story_counter)
+from scheduler import ensure_schedule_columns, parse_timestamp
+from search_index import (FTS_OPTIMIZE_INTERVAL_SECS, ensure_fts_index, get_schema_version, optimize_fts_index,
+                          set_schema_version)
+from source_health import ensure_source_health_table, get_source_health
+from translation import ensure_translation_columns
+from watchlist import Watchlist, add_indicators, ensure_watchlist_tables, hits_per_indicator, record_hits, retro_hunt
+
+# Columnas de las tarjetas del feed (sin contenido ni resumen)
+ARTICLE_LIST_COLUMNS = (
+    "a.id, a.source_id, a.title, a.url, a.published, a.translation_status, a.severity, a.threat_type, "
+    "CASE WHEN COALESCE(a.iocs, '') = '' THEN 0 "
+    "ELSE LENGTH(a.iocs) - LENGTH(REPLACE(a.iocs, ',', '')) + 1 END AS ioc_count, "
+    "(SELECT COUNT(*) FROM articles c WHERE c.cluster_id = a.id) AS cluster_size"
+)
+# Solo el representante de cada historia agrupada (ver clustering.py)
+CLUSTER_FILTER = " AND (a.cluster_id IS NULL OR a.cluster_id = a.id)"
+# Índices secundarios de `articles`, uno por forma de consulta; query_plans.py
+# revisa que ninguna sentencia de CTIDatabase recorra una tabla grande completa.
+# Subir QUERY_INDEX_VERSION al cambiar QUERY_INDEXES u OBSOLETE_INDEXES
+QUERY_INDEX_VERSION = 1
+QUERY_INDEXES = {
+    # Feed filtrado por criticidad, en orden (published_ts, id) sin ordenar aparte
+    'idx_articles_severity_published_ts': "articles(severity, published_ts, id)",
+    # Miembros de una historia (y tamaño de la historia en cada tarjeta)
+    'idx_articles_cluster_published_ts': "articles(cluster_id, published_ts, id)",
+}
+# Reemplazados por los de arriba o por los de published_ts; ninguna consulta los usa ya
+OBSOLETE_INDEXES = ("idx_articles_published", "idx_articles_source_published", "idx_articles_severity",
+                    "idx_articles_threat_type", "idx_articles_cluster")
+
+
+def published_epoch(value):
+    """`published` (datetime o texto ISO) a epoch UTC entero; None si no se puede.
+    
+    Un valor sin zona horaria se interpreta en la hora local, igual que
+    `datetime.now()`, de donde salen esos valores.
+    """
+    ts = parse_timestamp(value)
+    return int(ts) if ts is not None else None
+
+
+def window_start(days) -> int:
+    """Epoch del inicio de la ventana "últimos N días" """
+    return int(time.time() - float(days) * 86400)
+
+
+def backfill_published_ts(conn: sqlite3.Connection, batch_size: int = 5000) -> int:
+    """Completa `published_ts` de las filas que no lo tengan (no hace commit).
+    
+    Sale del índice de published_ts (los NULL van primero), así que en un
+    arranque normal no recorre la tabla.
+    """
+    updated, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, published FROM articles WHERE published_ts IS NULL AND id > ? "
+            "AND published IS NOT NULL ORDER BY id LIMIT ?", (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return updated
+        values = [(published_epoch(published), article_id) for article_id, published in rows]
+        conn.executemany("UPDATE articles SET published_ts = ? WHERE id = ?",
+                         [row for row in values if row[0] is not None])
+        updated += sum(1 for row in values if row[0] is not None)
+        last_id = rows[-1][0]
+
+
+def query_indexes_present(conn: sqlite3.Connection) -> bool:
+    """¿Existen todos los índices de QUERY_INDEXES?"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    return all(name in names for name in QUERY_INDEXES)
+
+
+def ensure_query_indexes(conn: sqlite3.Connection):
+    """Crea los índices de QUERY_INDEXES y borra los obsoletos; solo si faltan o cambió su versión"""
+    if get_schema_version(conn, 'query_indexes') == QUERY_INDEX_VERSION and query_indexes_present(conn):
+        return
+    for name, target in QUERY_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    for name in OBSOLETE_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    set_schema_version(conn, 'query_indexes', QUERY_INDEX_VERSION)
+    conn.commit()
+
+
+class ScanLock:
+    """Candado en la base de datos para que solo corra un escaneo a la vez.
+
+    Sirve entre procesos (ingest_daemon.py, api_endpoint.py). El candado
+    expira tras `ttl` segundos por si el proceso que lo tomó terminó sin
+    liberarlo.
+    """
+
+    def __init__(self, db_path: str, name: str = "rss_scan", ttl: int = 3600):
+        self.db_path = db_path
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def get_connection(self):
+        conn = connect(self.db_path, isolation_level=None)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_locks (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+        return conn
+
+    def acquire(self) -> bool:
+        conn = self.get_connection()
+        try:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM ingest_locks WHERE name = ? AND expires_at < ?", (self.name, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO ingest_locks (name, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?)",
+                (self.name, self.owner, now, now + self.ttl)
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self):
+        conn = self.get_connection()
+        try:
+            conn.execute("DELETE FROM ingest_locks WHERE name = ? AND owner = ?", (self.name, self.owner))
+        finally:
+            conn.close()
+
+    def holder(self):
+        """Retorna (owner, acquired_at) si el candado está tomado, o None"""
+        conn = self.get_connection()
+        try:
+            return conn.execute(
+                "SELECT owner, acquired_at FROM ingest_locks WHERE name = ? AND expires_at >= ?",
+                (self.name, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+
+
+# Clase para manejar la base de datos
+class CTIDatabase:
+    def __init__(self, db_path="cti_platform.db"):
+        self.db_path = db_path
+        self.has_fts = False
+        self.watchlist = Watchlist()
+        self.init_database()
+    
+    def get_connection(self):
+        # Conexión reutilizada por hilo, en modo WAL (ver db_pool.py)
+        return connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    
+    def init_database(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        # Tabla de fuentes RSS
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            url TEXT NOT NULL UNIQUE,
+            type TEXT DEFAULT 'threat_intel',
+            region TEXT,
+            enabled INTEGER DEFAULT 1,
+            last_fetched TIMESTAMP
+        )
+        """)
+        
+        # Validadores HTTP para GET condicional (ETag / Last-Modified / hash del cuerpo)
+        cursor.execute("PRAGMA table_info(sources)")
+        source_columns = {row[1] for row in cursor.fetchall()}
+        for column in ('etag', 'last_modified', 'content_hash'):
+            if column not in source_columns:
+                cursor.execute(f"ALTER TABLE sources ADD COLUMN {column} TEXT")
+        
+        # Tabla de artículos
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS articles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_id INTEGER,
+            title TEXT NOT NULL,
+            summary TEXT,
+            content TEXT,
+            url TEXT UNIQUE,
+            published TIMESTAMP,
+            fingerprint TEXT UNIQUE,
+            iocs TEXT,
+            tags TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (source_id) REFERENCES sources(id)
+        )
+        """)
+        
+        # `published` mezcla formatos (con zona -05:00, sin zona, con espacio o con T):
+        # ventanas de tiempo, orden y cursor usan su epoch UTC normalizado
+        cursor.execute("PRAGMA table_info(articles)")
+        if 'published_ts' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE articles ADD COLUMN published_ts INTEGER")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_articles_published_ts ON articles(published_ts, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_articles_source_published_ts "
+                       "ON articles(source_id, published_ts, id)")
+        backfill_published_ts(conn)
+        
+        # Columnas de la cola de traducción en segundo plano
+        ensure_translation_columns(conn)
+        
+        # Criticidad y tipo de amenaza persistidos (backfill de los que falten)
+        ensure_classification_columns(conn)
+        reclassify_articles(conn, only_missing=True)
+        
+        # IOCs normalizados (iocs / article_iocs), poblados desde articles.iocs la primera vez
+        ensure_ioc_tables(conn)
+        
+        # Watchlist de IOCs del SOC y sus coincidencias
+        ensure_watchlist_tables(conn)
+        
+        # Historias casi duplicadas entre fuentes (MinHash + LSH)
+        ensure_cluster_tables(conn)
+        
+        # Agregados del Dashboard, mantenidos por triggers (ver rollups.py)
+        ensure_rollup_tables(conn)
+        
+        # Generación de datos que invalida la caché de consultas compartida
+        ensure_data_generation(conn)
+        
+        # Planificación adaptativa de descargas por fuente y salud de cada una
+        ensure_schedule_columns(conn)
+        ensure_source_health_table(conn)
+        
+        # Índices de las consultas de CTIDatabase (las columnas ya existen)
+        ensure_query_indexes(conn)
+        
+        # Estado del servicio de ingesta (último escaneo, solicitudes desde la app)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_status (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """)
+        
+        # Inicializar fuentes por defecto si no existen
+        cursor.execute("SELECT COUNT(*) FROM sources")
+        if cursor.fetchone()[0] == 0:
+            default_sources = [
+                # Fuentes originales
+                ("Krebs on Security", "https://krebsonsecurity.com/feed/", "threat_intel", "Americas"),
+                ("The Hacker News", "https://feeds.feedburner.com/TheHackersNews", "threat_intel", "Global"),
+                ("Schneier on Security", "https://www.schneier.com/blog/atom.xml", "threat_intel", "Americas"),
+                ("Threatpost", "https://threatpost.com/feed/", "threat_intel", "Americas"),
+                ("Dark Reading", "https://www.darkreading.com/rss.xml", "threat_intel", "Americas"),
+                
+                # Nuevas fuentes de alta reputación
+                ("CISA Cybersecurity Alerts", "https://www.cisa.gov/cybersecurity-advisories/all.xml", "threat_intel", "Americas"),
+                ("US-CERT Alerts", "https://www.cisa.gov/uscert/ncas/alerts.xml", "threat_intel", "Americas"),
+                ("Bleeping Computer", "https://www.bleepingcomputer.com/feed/", "threat_intel", "Global"),
+                ("SecurityWeek", "https://www.securityweek.com/feed/", "threat_intel", "Global"),
+                ("Cyber Scoop", "https://cyberscoop.com/feed/", "threat_intel", "Americas"),
+                ("The Record by Recorded Future", "https://therecord.media/feed", "threat_intel", "Global"),
+                ("Ars Technica Security", "https://feeds.arstechnica.com/arstechnica/security", "threat_intel", "Americas"),
+                ("Graham Cluley", "https://grahamcluley.com/feed/", "threat_intel", "Europe"),
+                ("Kaspersky Securelist", "https://securelist.com/feed/", "threat_intel", "Global"),
+                ("Malwarebytes Labs", "https://blog.malwarebytes.com/feed/", "threat_intel", "Global"),
+                ("Talos Intelligence", "https://blog.talosintelligence.com/rss/", "threat_intel", "Americas"),
+                ("Sophos News", "https://news.sophos.com/en-us/feed/", "threat_intel", "Global"),
+                ("Palo Alto Networks Unit 42", "https://unit42.paloaltonetworks.com/feed/", "threat_intel", "Americas"),
+                ("Microsoft Security Blog", "https://www.microsoft.com/en-us/security/blog/feed/", "threat_intel", "Global"),
+                ("Google Security Blog", "https://security.googleblog.com/feeds/posts/default", "threat_intel", "Global"),
+            ]
+            cursor.executemany(
+                "INSERT INTO sources (name, url, type, region) VALUES (?, ?, ?, ?)",
+                default_sources
+            )
+        
+        # Confirmar lo anterior: si SQLite no tiene FTS5, ensure_fts_index
+        # deshace su propia transacción y no debe llevarse las fuentes
+        conn.commit()
+        
+        # Índice FTS5 para la búsqueda: se detecta en cada arranque y solo se
+        # reconstruye si falta o cambió su versión de esquema
+        self.has_fts = ensure_fts_index(conn)
+        
+        conn.commit()
+        conn.close()
+    
+    def _cached(self, name: str, params: tuple, compute, tables=('articles', 'sources')):
+        """Resultado de `compute()` desde la caché compartida (ver query_cache.py).
+        
+        La clave es (base, consulta, parámetros normalizados); la entrada vale
+        mientras no cambie la generación de `tables`. Leer la generación es
+        una consulta a una tabla de dos filas.
+        """
+        conn = self.get_connection()
+        try:
+            generations = read_generations(conn)
+        finally:
+            conn.close()
+        generation = tuple(generations.get(table) for table in tables)
+        key = (self.db_path, name, params)
+        result = query_cache.get(key, generation)
+        if result is None:
+            result = compute()
+            query_cache.put(key, generation, result)
+        return result
+    
+    @staticmethod
+    def normalize_search(search_query):
+        """Búsqueda sin espacios de más ('' -> None): misma entrada de caché"""
+        return ' '.join((search_query or '').split()) or None
+    
+    def get_sources(self):
+        return self._cached('sources', (), self._get_sources, tables=('sources',))
+    
+    def _get_sources(self):
+        conn = self.get_connection()
+        df = pd.read_sql_query("SELECT * FROM sources WHERE enabled = 1", conn)
+        conn.close()
+        return df
+    
+    @staticmethod
+    def fts_query(search_query: str) -> str:
+        # Saneamiento básico para consulta FTS: si no hay operadores, usar prefijos
+        q = (search_query or '').strip()
+        ops = ['"', ' AND ', ' OR ', ' NOT ', ' NEAR ', '*']
+        if not any(op in q for op in ops):
+            terms = [t for t in re.split(r"\s+", q) if t]
+            if terms:
+                q = " ".join([f"{t}*" for t in terms])
+        return q
+    
+    def get_articles(self, limit=50, source_id=None, search_query=None, days=None, offset=0,
+                     cursor=None, columns="a.*", severity=None, collapse_clusters=False):
+        """Artículos más recientes (o más relevantes si hay búsqueda FTS).
+        
+        Para paginar se pasa `cursor=next_page_cursor(df)` de la página
+        anterior en lugar de `offset`: la consulta arranca justo después de
+        la última fila vista, así que la página N cuesta lo mismo que la 1.
+        `columns` permite traer solo parte de `articles` (ver get_article_list).
+        Con `collapse_clusters` cada historia repetida entre fuentes aparece
+        una sola vez, con el artículo representante.
+        El resultado se cachea en el proceso, compartido entre sesiones,
+        hasta la próxima escritura en `articles` o `sources`.
+        """
+        search_query = self.normalize_search(search_query)
+        source_id = int(source_id) if source_id else None
+        cursor = (None if cursor[0] is None else float(cursor[0]), int(cursor[1])) if cursor else None
+        params = (limit, source_id, search_query, days, offset, cursor, columns, severity, bool(collapse_clusters))
+        return self._cached('articles', params, lambda: self._get_articles(*params))
+    
+    def _get_articles(self, limit, source_id, search_query, days, offset, cursor, columns, severity,
+                      collapse_clusters):
+        # Si hay término de búsqueda y FTS disponible, usar FTS para resultados relevantes
+        if search_query and self.has_fts:
+            try:
+                conn = self.get_connection()
+                query = (
+                    f"SELECT {columns}, a.published_ts AS published_key, s.name as source_name, "
+                    "bm25(articles_fts) as score "
+                    "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+                    "JOIN sources s ON a.source_id = s.id "
+                    "WHERE articles_fts MATCH ?"
+                )
+                params = [self.fts_query(search_query)]
+                if source_id:
+                    query += " AND a.source_id = ?"
+                    params.append(source_id)
+                if severity:
+                    query += " AND a.severity = ?"
+                    params.append(severity)
+                if days:
+                    query += " AND a.published_ts >= ?"
+                    params.append(window_start(days))
+                if collapse_clusters:
+                    query += CLUSTER_FILTER
+                if cursor:
+                    # Cursor (score, id): menor bm25 = más relevante
+                    query += " AND (bm25(articles_fts) > ? OR (bm25(articles_fts) = ? AND a.id < ?))"
+                    params.extend([cursor[0], cursor[0], cursor[1]])
+                query += " ORDER BY score ASC, a.id DESC LIMIT ?"
+                params.append(limit)
+                if not cursor:
+                    query += " OFFSET ?"
+                    params.append(offset)
+                df = pd.read_sql_query(query, conn, params=params)
+                conn.close()
+                return df
+            except sqlite3.Error:
+                # Fallback a búsqueda simple si FTS falla
+                pass
+
+        # Fallback: búsqueda tradicional por LIKE u obtención simple
+        conn = self.get_connection()
+        query = f"""
+        SELECT {columns}, a.published_ts AS published_key, s.name as source_name 
+        FROM articles a 
+        JOIN sources s ON a.source_id = s.id
+        WHERE 1=1
+        """
+        params = []
+        
+        if source_id:
+            query += " AND a.source_id = ?"
+            params.append(source_id)
+        if severity:
+            query += " AND a.severity = ?"
+            params.append(severity)
+        
+        if search_query:
+            query += " AND (a.title LIKE ? OR a.content LIKE ? OR a.summary LIKE ?)"
+            search_term = f"%{search_query}%"
+            params.extend([search_term, search_term, search_term])
+        
+        if days:
+            query += " AND a.published_ts >= ?"
+            params.append(window_start(days))
+        if collapse_clusters:
+            query += CLUSTER_FILTER
+        order = " ORDER BY a.published_ts DESC, a.id DESC LIMIT ?"
+        
+        if cursor and cursor[0] is None:
+            # La página anterior terminó en filas sin fecha: siguen por id
+            df = pd.read_sql_query(query + " AND a.published_ts IS NULL AND a.id < ?" + order, conn,
+                                   params=params + [cursor[1], limit])
+        elif cursor:
+            # Cursor (published_ts, id) de la última fila de la página anterior
+            # (comparación de row values: usa idx_articles_published_ts)
+            df = pd.read_sql_query(query + " AND (a.published_ts, a.id) < (?, ?)" + order, conn,
+                                   params=params + [cursor[0], cursor[1], limit])
+            if len(df) < limit:
+                # Las filas sin fecha van al final (NULL es el menor en ORDER BY ... DESC)
+                undated = pd.read_sql_query(query + " AND a.published_ts IS NULL" + order, conn,
+                                            params=params + [limit - len(df)])
+                if not undated.empty:
+                    df = pd.concat([df, undated], ignore_index=True) if not df.empty else undated
+        else:
+            df = pd.read_sql_query(query + order + " OFFSET ?", conn, params=params + [limit, offset])
+        conn.close()
+        return df
+    
+    def get_article_list(self, limit=50, source_id=None, search_query=None, days=None,
+                         cursor=None, severity=None, collapse_clusters=False):
+        """Proyección ligera para las tarjetas del feed.
+        
+        Sin contenido, resumen ni IOCs: solo lo que muestra la tarjeta, su
+        clasificación, el número de IOCs y el tamaño de su historia
+        (`cluster_size`). El detalle se pide con get_article_detail.
+        """
+        return self.get_articles(limit=limit, source_id=source_id, search_query=search_query,
+                                 days=days, cursor=cursor, columns=ARTICLE_LIST_COLUMNS,
+                                 severity=severity, collapse_clusters=collapse_clusters)
+    
+    def get_article_detail(self, article_id: int) -> dict:
+        """Artículo completo por id, desde la caché compartida (ver query_cache.py).
+        
+        Cualquier escritura en `articles` (traducción, reclasificación,
+        re-extracción de IOCs) invalida lo cacheado.
+        """
+        detail = self._cached('detail', (int(article_id),),
+                              lambda: self._get_article_detail(int(article_id)), tables=('articles',))
+        # Copia: el diccionario cacheado lo comparten todas las sesiones
+        return dict(detail) if detail else detail
+    
+    def _get_article_detail(self, article_id: int) -> dict:
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("SELECT * FROM articles WHERE id = ?", (article_id,))
+            row = cursor.fetchone()
+            return dict(zip([c[0] for c in cursor.description], row)) if row else None
+        finally:
+            conn.close()
+    
+    def get_cluster_members(self, article_id: int) -> pd.DataFrame:
+        """Los demás artículos de la misma historia, del más antiguo al más nuevo"""
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query("""
+            SELECT a.id, a.title, a.url, a.published, s.name AS source_name
+            FROM articles a JOIN sources s ON a.source_id = s.id
+            WHERE a.cluster_id = (SELECT cluster_id FROM articles WHERE id = ?) AND a.id != ?
+            ORDER BY a.published_ts, a.id
+            """, conn, params=[int(article_id), int(article_id)])
+        finally:
+            conn.close()
+    
+    def rebuild_clusters(self) -> int:
+        """Reagrupar todo el corpus (p. ej. tras cambiar NEAR_DUP_THRESHOLD)"""
+        conn = self.get_connection()
+        try:
+            count = rebuild_clusters(conn)
+            conn.commit()
+            return count
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def next_page_cursor(articles_df):
+        """Cursor para pedir la página siguiente a `articles_df` (None si está vacía).
+        
+        Si la última fila no tiene `published_ts` el cursor es (None, id).
+        """
+        if articles_df.empty:
+            return None
+        last = articles_df.iloc[-1]
+        if 'score' in articles_df.columns:
+            return float(last['score']), int(last['id'])
+        if pd.isna(last['published_key']):
+            return None, int(last['id'])
+        return int(last['published_key']), int(last['id'])
+
+    def count_articles(self, source_id=None, search_query=None, days=None, severity=None,
+                       collapse_clusters=False) -> int:
+        """Conteo total para paginación.
+        
+        Se cachea en el proceso (compartido entre sesiones de Streamlit)
+        hasta la próxima escritura en `articles` o QUERY_CACHE_TTL segundos.
+        """
+        params = (int(source_id) if source_id else None, self.normalize_search(search_query), days,
+                  severity, bool(collapse_clusters))
+        return self._cached('count', params, lambda: self._count_articles(*params), tables=('articles',))
+    
+    def _count_articles(self, source_id=None, search_query=None, days=None, severity=None,
+                        collapse_clusters=False) -> int:
+        if not (search_query or days or severity):
+            # Sin filtros (o solo por fuente) los contadores del corpus ya tienen la respuesta
+            if collapse_clusters:
+                return self.get_story_total(source_id)
+            return self.get_article_total(source_id)
+        if search_query and self.has_fts:
+            try:
+                conn = self.get_connection()
+                query = (
+                    "SELECT COUNT(1) AS cnt FROM articles_fts "
+                    "JOIN articles a ON a.id = articles_fts.rowid "
+                    "WHERE articles_fts MATCH ?"
+                )
+                params = [self.fts_query(search_query)]
+                if source_id:
+                    query += " AND a.source_id = ?"
+                    params.append(source_id)
+                if severity:
+                    query += " AND a.severity = ?"
+                    params.append(severity)
+                if days:
+                    query += " AND a.published_ts >= ?"
+                    params.append(window_start(days))
+                if collapse_clusters:
+                    query += CLUSTER_FILTER
+                row = pd.read_sql_query(query, conn, params=params).iloc[0]
+                conn.close()
+                return int(row['cnt'])
+            except sqlite3.Error:
+                pass
+
+        conn = self.get_connection()
+        query = "SELECT COUNT(1) AS cnt FROM articles a WHERE 1=1"
+        params = []
+        if source_id:
+            query += " AND a.source_id = ?"
+            params.append(source_id)
+        if severity:
+            query += " AND a.severity = ?"
+            params.append(severity)
+        if search_query:
+            query += " AND (a.title LIKE ? OR a.content LIKE ? OR a.summary LIKE ?)"
+            search_term = f"%{search_query}%"
+            params.extend([search_term, search_term, search_term])
+        if days:
+            query += " AND a.published_ts >= ?"
+            params.append(window_start(days))
+        if collapse_clusters:
+            query += CLUSTER_FILTER
+        row = pd.read_sql_query(query, conn, params=params).iloc[0]
+        conn.close()
+        return int(row['cnt'])
+    
+    def add_article(self, article_data, translation_status='done'):
+        return self.add_articles([article_data], translation_status)[0]
+    
+    def add_articles(self, articles: Iterable[tuple], translation_status='done') -> List[bool]:
+        """Insertar varios artículos en una sola transacción.
+        
+        Cada artículo es (source_id, title, summary, content, url, published,
+        fingerprint, iocs, tags); la criticidad y el tipo de amenaza se
+        calculan aquí; cada artículo nuevo se une a su historia (clustering.py)
+        y se compara con la watchlist.
+        Retorna, en el mismo orden, True si la fila se insertó o False si
+        ya existía (url o fingerprint duplicados).
+        """
+        rows = [(*article_data, translation_status,
+                 *classify_article(article_data[1], article_data[3], article_data[2]),
+                 published_epoch(article_data[5]))
+                for article_data in articles]
+        if not rows:
+            return []
+        conn = self.get_connection()
+        try:
+            with conn:
+                cursor = conn.cursor()
+                outcomes = []
+                self.watchlist.refresh(conn)
+                # Una sentencia por fila dentro de la misma transacción: el
+                # rowcount de cada INSERT OR IGNORE indica si era duplicado
+                for row in rows:
+                    cursor.execute("""
+                    INSERT OR IGNORE INTO articles (source_id, title, summary, content, url, published,
+                                                    fingerprint, iocs, tags, translation_status,
+                                                    severity, threat_type, published_ts)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, row)
+                    outcomes.append(cursor.rowcount == 1)
+                    if cursor.rowcount != 1:
+                        continue
+                    article_id = cursor.lastrowid
+                    assign_cluster(conn, article_id, row[1], row[3], row[-1])
+                    if row[7]:
+                        link_article_iocs(conn, article_id, row[7].split(','), row[5])
+                    if len(self.watchlist):
+                        # Sin el tope de IOCs por artículo: cualquier mención cuenta
+                        watch_ids = (self.watchlist.match(extract(f"{row[1]} {row[3] or ''}", limit=0))
+                                     + self.watchlist.match_stored(row[7]))
+                        record_hits(conn, article_id, watch_ids)
+            return outcomes
+        finally:
+            conn.close()
+    
+    def reclassify_articles(self) -> int:
+        """Recalcular severity / threat_type de todo el corpus"""
+        conn = self.get_connection()
+        try:
+            return reclassify_articles(conn, only_missing=False)
+        finally:
+            conn.close()
+    
+    def get_classification_counts(self, days=None) -> pd.DataFrame:
+        """Artículos por (severity, threat_type), desde los agregados"""
+        conn = self.get_connection()
+        try:
+            return classification_counts(conn, days)
+        finally:
+            conn.close()
+    
+    def get_ioc_type_counts(self) -> pd.DataFrame:
+        """Menciones de IOCs por tipo, desde los agregados"""
+        conn = self.get_connection()
+        try:
+            return ioc_type_counts(conn)
+        finally:
+            conn.close()
+    
+    def get_daily_counts(self, days=None) -> pd.DataFrame:
+        """Artículos por día de publicación (todos los días sin `days`)"""
+        conn = self.get_connection()
+        try:
+            return daily_counts(conn, days)
+        finally:
+            conn.close()
+    
+    def get_source_counts(self) -> pd.DataFrame:
+        """Artículos por fuente, desde los agregados"""
+        conn = self.get_connection()
+        try:
+            return source_counts(conn)
+        finally:
+            conn.close()
+    
+    def get_article_total(self, source_id=None) -> int:
+        """Artículos del corpus (o de una fuente), desde `corpus_counters`"""
+        name = TOTAL_ARTICLES if source_id is None else source_counter(source_id)
+        conn = self.get_connection()
+        try:
+            return int(read_counter(conn, name))
+        finally:
+            conn.close()
+    
+    def get_story_total(self, source_id=None) -> int:
+        """Historias (representantes de cada grupo) del corpus o de una fuente"""
+        conn = self.get_connection()
+        try:
+            return int(read_counter(conn, story_counter(source_id)))
+        finally:
+            conn.close()
+    
+    def get_last_ingest_at(self):
+        """Timestamp del último artículo insertado (None si no hay ninguno)"""
+        conn = self.get_connection()
+        try:
+            return read_counter(conn, LAST_INGEST_AT, default=None)
+        finally:
+            conn.close()
+    
+    def get_dashboard_totals(self) -> dict:
+        """Totales y ventanas recientes del Dashboard (ver rollups.dashboard_totals)"""
+        conn = self.get_connection()
+        try:
+            return dashboard_totals(conn)
+        finally:
+            conn.close()
+    
+    def find_articles_by_ioc(self, value: str, limit: int = 50) -> pd.DataFrame:
+        """Artículos que mencionan un IOC (acepta valores defangeados: evil[.]com)"""
+        ioc = parse_stored_ioc(value)
+        if ioc is None:
+            return pd.DataFrame()
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query(f"""
+            SELECT {ARTICLE_LIST_COLUMNS}, s.name AS source_name
+            FROM iocs i
+            JOIN article_iocs ai ON ai.ioc_id = i.id
+            JOIN articles a ON a.id = ai.article_id
+            JOIN sources s ON a.source_id = s.id
+            WHERE i.value = ?
+            ORDER BY a.published_ts DESC, a.id DESC
+            LIMIT ?
+            """, conn, params=[ioc.value, limit])
+        finally:
+            conn.close()
+    
+    def reextract_iocs(self, workers: int = 1) -> int:
+        """Volver a extraer los IOCs de todo el corpus (ver ioc_extraction.reextract_iocs)"""
+        conn = self.get_connection()
+        try:
+            return reextract_iocs(conn, workers=workers)
+        finally:
+            conn.close()
+    
+    def add_watchlist_indicators(self, values: Iterable[str], label: str = None):
+        """Cargar indicadores en la watchlist; retorna (agregados, rechazados)"""
+        conn = self.get_connection()
+        try:
+            return add_indicators(conn, values, label)
+        finally:
+            conn.close()
+    
+    def retro_hunt(self, workers: int = 1) -> int:
+        """Comparar todo el histórico con la watchlist; retorna las coincidencias nuevas"""
+        conn = self.get_connection()
+        try:
+            return retro_hunt(conn, self.watchlist, workers=workers)
+        finally:
+            conn.close()
+    
+    def get_watchlist_hits(self, limit: int = None) -> list:
+        """Coincidencias por indicador, de más a menos artículos"""
+        conn = self.get_connection()
+        try:
+            return hits_per_indicator(conn, limit)
+        finally:
+            conn.close()
+    
+    def maintain_search_index(self, force: bool = False) -> bool:
+        """Optimizar el índice FTS si pasó FTS_OPTIMIZE_INTERVAL_SECS desde la última vez"""
+        if not self.has_fts:
+            return False
+        last = float(self.get_ingest_status().get('fts_optimized_at') or 0)
+        if not force and time.time() - last < FTS_OPTIMIZE_INTERVAL_SECS:
+            return False
+        conn = self.get_connection()
+        try:
+            optimize_fts_index(conn)
+        finally:
+            conn.close()
+        self.set_ingest_status(fts_optimized_at=time.time())
+        return True
+    
+    def get_source_health(self) -> pd.DataFrame:
+        """Fallos consecutivos, latencia y último error por fuente (ver source_health.py)"""
+        conn = self.get_connection()
+        try:
+            return get_source_health(conn)
+        finally:
+            conn.close()
+    
+    def get_ingest_status(self) -> dict:
+        conn = self.get_connection()
+        try:
+            return dict(conn.execute("SELECT key, value FROM ingest_status").fetchall())
+        finally:
+            conn.close()
+    
+    def set_ingest_status(self, **values):
+        conn = self.get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ingest_status (key, value) VALUES (?, ?)",
+                [(key, str(value)) for key, value in values.items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def request_scan(self):
+        """Pedir al servicio de ingesta un escaneo inmediato"""
+        self.set_ingest_status(scan_requested_at=time.time())
+    
+    def get_source_validators(self, source_id) -> dict:
+        conn = self.get_connection()
+        try:
+            row = conn.execute(
+                "SELECT etag, last_modified, content_hash FROM sources WHERE id = ?",
+                (int(source_id),)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return {}
+        return dict(zip(('etag', 'last_modified', 'content_hash'), row))
+    
+    def update_source_validators(self, source_id, etag, last_modified, content_hash):
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                "UPDATE sources SET etag = ?, last_modified = ?, content_hash = ? WHERE id = ?",
+                (etag, last_modified, content_hash, int(source_id))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def update_source_fetch_time(self, source_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE sources SET last_fetched = datetime('now') WHERE id = ?", 
+                      (source_id,))
+        conn.commit()
+        conn.close()
+
+
+def benchmark(n_articles: int = 10000):
+    """Compara add_article (una transacción por fila) con add_articles (una por lote)"""
+    import tempfile
+
+    def synthetic(offset):
+        return [(1, f"Ransomware campaign #{i}", f"Resumen del artículo {i}", f"Contenido {i} " * 20,
+                 f"https://example.com/{i}", datetime.now(), f"fp-{i}", '', 'threat_intel')
+                for i in range(offset, offset + n_articles)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = CTIDatabase(os.path.join(tmp, "bench.db"))
+        articles = synthetic(0)
+        start = time.perf_counter()
+        for article_data in articles:
+            db.add_article(article_data)
+        single_secs = time.perf_counter() - start
+
+        articles = synthetic(n_articles)
+        start = time.perf_counter()
+        inserted = sum(db.add_articles(articles))
+        bulk_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        duplicates = n_articles - sum(db.add_articles(articles))
+        dup_secs = time.perf_counter() - start
+
+    print(f"Artículos: {n_articles}")
+    print(f"  add_article (fila a fila): {single_secs:.2f}s · {n_articles / single_secs:.0f} art/s")
+    print(f"  add_articles (un lote):    {bulk_secs:.2f}s · {n_articles / bulk_secs:.0f} art/s "
+          f"({inserted} insertados)")
+    print(f"  add_articles (duplicados): {dup_secs:.2f}s · {duplicates} omitidos")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(*(int(a) for a in sys.argv[2:3]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "reclassify":
+        db = CTIDatabase(sys.argv[2] if len(sys.argv) > 2 else "cti_platform.db")
+        print(f"Artículos reclasificados: {db.reclassify_articles()}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "reextract-iocs":
+        db = CTIDatabase(sys.argv[2] if len(sys.argv) > 2 else "cti_platform.db")
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+        print(f"Artículos procesados: {db.reextract_iocs(workers)}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "recluster":
+        db = CTIDatabase(sys.argv[2] if len(sys.argv) > 2 else "cti_platform.db")
+        print(f"Artículos reagrupados: {db.rebuild_clusters()}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "ioc":
+        db = CTIDatabase(sys.argv[3] if len(sys.argv) > 3 else "cti_platform.db")
+        print(db.find_articles_by_ioc(sys.argv[2])[['id', 'published', 'source_name', 'title']]
+              .to_string(index=False))
+    else:
+        print("Uso: python database.py benchmark [N_ARTICULOS]")
+        print("     python database.py reclassify [RUTA_BD]   # tras cambiar las palabras clave")
+        print("     python database.py reextract-iocs [RUTA_BD] [PROCESOS]")
+        print("     python database.py ioc VALOR [RUTA_BD]")
+        print("     python database.py recluster [RUTA_BD]    # tras cambiar NEAR_DUP_THRESHOLD")
@@ -0,0 +1,75 @@
+"""
+Conexiones SQLite reutilizables por hilo
+Modo WAL y pragmas comunes para la app, el servicio de ingesta y el worker de traducción
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+# Configuración (sobrescribible por variables de entorno)
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "20000"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT = 30  # segundos que un escritor espera a otro
+
+# Adaptadores de fecha/hora (Python 3.12+ ya no los registra por defecto).
+# Son globales al módulo sqlite3, así que basta con registrarlos una vez.
+sqlite3.register_adapter(datetime, lambda val: val.isoformat())
+sqlite3.register_converter("timestamp", lambda val: datetime.fromisoformat(val.decode()))
+
+
+class PooledConnection(sqlite3.Connection):
+    """Conexión que sobrevive a `close()`.
+
+    El código existente abre y cierra una conexión por operación; con esta
+    clase `close()` solo descarta la transacción abierta y la conexión se
+    reutiliza en la siguiente llamada del mismo hilo.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+def apply_pragmas(conn: sqlite3.Connection):
+    """WAL permite que los lectores (Streamlit) no esperen a un escaneo en curso"""
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        pass  # base de solo lectura: se queda con el journal que tenga
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+_local = threading.local()
+
+
+def connect(db_path: str, detect_types: int = 0, isolation_level: str = "") -> sqlite3.Connection:
+    """Retorna la conexión de este hilo para `db_path`, creándola si hace falta.
+
+    Las conexiones se separan por `detect_types` e `isolation_level` porque
+    no se pueden cambiar después de abrirlas sin afectar a otros usuarios.
+    """
+    pool = getattr(_local, "connections", None)
+    if pool is None:
+        pool = _local.connections = {}
+    key = (os.path.abspath(db_path), detect_types, isolation_level)
+    conn = pool.get(key)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT, detect_types=detect_types,
+                               isolation_level=isolation_level, factory=PooledConnection)
+        apply_pragmas(conn)
+        pool[key] = conn
+    return conn
+
+
+def close_thread_connections():
+    """Cierra de verdad las conexiones de este hilo (p. ej. antes de borrar la base)"""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.really_close()
+    _local.connections = {}
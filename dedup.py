@@ -0,0 +1,91 @@
+"""
+Pre-filtro de duplicados para la ingesta RSS
+Descarta entradas ya almacenadas antes de limpiar HTML, traducir o extraer IOCs
+"""
+import sqlite3
+from typing import Callable, Iterable, List, Set, Tuple
+
+# Límite conservador de parámetros por consulta (SQLite < 3.32 admite 999)
+MAX_SQL_VARS = 900
+# Tamaño máximo del conjunto en memoria antes de vaciarlo
+MAX_KNOWN_KEYS = 200_000
+
+
+def find_existing_keys(conn: sqlite3.Connection, urls: Iterable[str],
+                       fingerprints: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """Consulta en bloque qué URLs y fingerprints ya existen en `articles`.
+
+    Retorna (urls_existentes, fingerprints_existentes).
+    """
+    urls = list({u for u in urls if u is not None})
+    fingerprints = list({f for f in fingerprints if f is not None})
+    found_urls, found_fps = set(), set()
+    half = MAX_SQL_VARS // 2
+    for start in range(0, max(len(urls), len(fingerprints)), half):
+        url_chunk = urls[start:start + half]
+        fp_chunk = fingerprints[start:start + half]
+        query = (
+            "SELECT url, fingerprint FROM articles "
+            f"WHERE url IN ({','.join('?' * len(url_chunk)) or 'NULL'}) "
+            f"OR fingerprint IN ({','.join('?' * len(fp_chunk)) or 'NULL'})"
+        )
+        for url, fingerprint in conn.execute(query, url_chunk + fp_chunk):
+            found_urls.add(url)
+            found_fps.add(fingerprint)
+    return found_urls, found_fps
+
+
+class KnownArticleFilter:
+    """Filtra entradas de feed que ya están en la base de datos.
+
+    Mantiene un conjunto en memoria con las claves vistas, así que las
+    entradas repetidas entre escaneos no vuelven a consultar SQLite.
+    """
+
+    def __init__(self, fingerprint_fn: Callable[[str, str], str]):
+        self.fingerprint_fn = fingerprint_fn
+        self.known_urls = set()
+        self.known_fingerprints = set()
+
+    def entry_keys(self, entry) -> Tuple[str, str]:
+        """Clave (url, fingerprint) de una entrada, igual que al insertarla"""
+        title = entry.get('title', 'Sin título')
+        link = entry.get('link', '')
+        return link, self.fingerprint_fn(title, link)
+
+    def _trim(self):
+        if len(self.known_urls) + len(self.known_fingerprints) > MAX_KNOWN_KEYS:
+            self.known_urls.clear()
+            self.known_fingerprints.clear()
+
+    def mark_known(self, url: str, fingerprint: str):
+        self.known_urls.add(url)
+        self.known_fingerprints.add(fingerprint)
+
+    def is_known(self, url: str, fingerprint: str) -> bool:
+        return url in self.known_urls or fingerprint in self.known_fingerprints
+
+    def filter_new(self, conn: sqlite3.Connection, entries) -> List:
+        """Retorna solo las entradas nuevas (una consulta por lote)"""
+        self._trim()
+        keyed = [(entry, *self.entry_keys(entry)) for entry in entries]
+        pending = [k for k in keyed if not self.is_known(k[1], k[2])]
+        if pending:
+            found_urls, found_fps = find_existing_keys(
+                conn, (k[1] for k in pending), (k[2] for k in pending)
+            )
+            self.known_urls.update(found_urls)
+            self.known_fingerprints.update(found_fps)
+
+        new_entries = []
+        batch_urls, batch_fps = set(), set()
+        for entry, url, fingerprint in pending:
+            if self.is_known(url, fingerprint):
+                continue
+            # Duplicados dentro del mismo lote
+            if url in batch_urls or fingerprint in batch_fps:
+                continue
+            batch_urls.add(url)
+            batch_fps.add(fingerprint)
+            new_entries.append(entry)
+        return new_entries
@@ -0,0 +1,154 @@
+"""
+Descarga concurrente de feeds RSS con GET condicional
+Usado por el servicio de ingesta (ingestion.py) y por api_endpoint.py
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import feedparser
+import requests
+
+# Configuración (sobrescribible por variables de entorno)
+DEFAULT_MAX_WORKERS = int(os.getenv("FEED_FETCH_WORKERS", "8"))
+DEFAULT_PER_HOST_LIMIT = int(os.getenv("FEED_FETCH_PER_HOST", "2"))
+FEED_CONNECT_TIMEOUT = float(os.getenv("FEED_CONNECT_TIMEOUT", "5"))     # segundos
+FEED_READ_TIMEOUT = float(os.getenv("FEED_READ_TIMEOUT", "20"))          # sin recibir datos
+FEED_TOTAL_TIMEOUT = float(os.getenv("FEED_TOTAL_TIMEOUT", "60"))        # descarga completa
+FEED_MAX_BYTES = int(os.getenv("FEED_MAX_BYTES", str(5 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+
+class FetchResult:
+    """Resultado de descargar un feed.
+
+    `status` es 'ok', 'not_modified' (HTTP 304), 'unchanged' (mismo hash de
+    contenido que la última vez) o 'error'. Solo con 'ok' hay `feed` parseado.
+    `latency` son los segundos de la petición y la descarga del cuerpo.
+    """
+
+    def __init__(self, status: str, feed=None, error: str = None, etag: str = None,
+                 last_modified: str = None, content_hash: str = None, latency: float = None):
+        self.status = status
+        self.feed = feed
+        self.error = error
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.latency = latency
+
+    @property
+    def skipped(self) -> bool:
+        """El feed no cambió y no hace falta procesarlo"""
+        return self.status in ('not_modified', 'unchanged')
+
+
+class ConcurrentFeedFetcher:
+    """Descarga varios feeds en paralelo con un pool de hilos.
+
+    El tiempo total de un escaneo pasa a ser aproximadamente el del feed más
+    lento en lugar de la suma de todos. Un semáforo por host limita cuántas
+    descargas simultáneas recibe un mismo servidor (p. ej. cisa.gov).
+
+    Cada descarga envía If-None-Match / If-Modified-Since con los valores
+    guardados de la fuente; si el servidor responde 304 o el cuerpo tiene el
+    mismo hash que la última vez, el feed no se parsea.
+
+    Una fuente lenta o colgada no frena el escaneo: hay timeouts de conexión,
+    de lectura y de descarga total, y un tope de tamaño del cuerpo.
+    """
+
+    def __init__(self, max_workers: int = None, per_host_limit: int = None,
+                 max_bytes: int = FEED_MAX_BYTES, total_timeout: float = FEED_TOTAL_TIMEOUT):
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+        self.per_host_limit = max(1, per_host_limit or DEFAULT_PER_HOST_LIMIT)
+        self.max_bytes = max_bytes
+        self.total_timeout = total_timeout
+        self._host_locks = {}
+        self._host_locks_guard = threading.Lock()
+
+    def _host_semaphore(self, url: str) -> threading.Semaphore:
+        host = (urlparse(url).hostname or '').lower()
+        with self._host_locks_guard:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_locks[host]
+
+    def fetch_one(self, url: str, validators: dict = None) -> FetchResult:
+        """Descarga y parsea un feed.
+
+        `validators` puede traer 'etag', 'last_modified' y 'content_hash'
+        de la descarga anterior.
+        """
+        validators = validators or {}
+        headers = {'User-Agent': feedparser.USER_AGENT}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        start = time.monotonic()
+        try:
+            with self._host_semaphore(url):
+                start = time.monotonic()   # la latencia no incluye la espera por host
+                with requests.get(url, headers=headers, stream=True,
+                                  timeout=(FEED_CONNECT_TIMEOUT, FEED_READ_TIMEOUT)) as response:
+                    body = self._read_body(response, start) if response.status_code < 300 else b''
+            latency = time.monotonic() - start
+            if response.status_code == 304:
+                return FetchResult('not_modified', etag=validators.get('etag'),
+                                   last_modified=validators.get('last_modified'),
+                                   content_hash=validators.get('content_hash'), latency=latency)
+            if response.status_code >= 400:
+                return FetchResult('error', error=f"HTTP {response.status_code}", latency=latency)
+
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            content_hash = hashlib.sha256(body).hexdigest()
+            if content_hash == validators.get('content_hash'):
+                return FetchResult('unchanged', etag=etag, last_modified=last_modified,
+                                   content_hash=content_hash, latency=latency)
+
+            feed = feedparser.parse(body, response_headers={
+                'content-location': response.url,
+                'content-type': response.headers.get('Content-Type', ''),
+            })
+            return FetchResult('ok', feed=feed, etag=etag, last_modified=last_modified,
+                               content_hash=content_hash, latency=latency)
+        except Exception as e:
+            return FetchResult('error', error=str(e) or type(e).__name__,
+                               latency=time.monotonic() - start)
+
+    def _read_body(self, response, start: float) -> bytes:
+        """Lee el cuerpo respetando FEED_MAX_BYTES y FEED_TOTAL_TIMEOUT"""
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ValueError(f"Respuesta de {int(declared)} bytes (máximo {self.max_bytes})")
+        chunks, size = [], 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise ValueError(f"Respuesta mayor a {self.max_bytes} bytes")
+            if time.monotonic() - start > self.total_timeout:
+                raise TimeoutError(f"Descarga de más de {self.total_timeout:.0f}s")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def fetch_all(self, sources):
+        """Descarga en paralelo una lista de (clave, url) o (clave, url, validators).
+
+        Genera (clave, FetchResult) a medida que cada descarga termina, para
+        que el procesamiento de entradas (BD, IOCs) siga ocurriendo en el
+        hilo que llama.
+        """
+        sources = [tuple(source) + (None,) * (3 - len(source)) for source in sources]
+        if not sources:
+            return
+        workers = min(self.max_workers, len(sources))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-fetch") as pool:
+            futures = {pool.submit(self.fetch_one, url, validators): key
+                       for key, url, validators in sources}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
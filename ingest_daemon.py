@@ -0,0 +1,145 @@
+"""
+Servicio de ingesta RSS independiente de Streamlit
+Descarga los feeds, guarda artículos y los traduce en segundo plano;
+la app de Streamlit solo lee la base de datos.
+
+Uso:
+    python ingest_daemon.py                 # servicio continuo
+    python ingest_daemon.py --once          # escanear todas las fuentes y salir
+    python ingest_daemon.py --interval 120 --max-articles 25
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+from database import CTIDatabase, ScanLock
+from ingestion import RSSProcessor
+from translation import TranslationWorker, start_translation_worker
+
+# Configuración (sobrescribible por variables de entorno o argumentos)
+DB_PATH = os.getenv("CTI_DB_PATH", "cti_platform.db")
+SCAN_INTERVAL_SECS = int(os.getenv("SCAN_INTERVAL_SECS", "60"))  # revisión de fuentes vencidas
+MAX_ARTICLES_PER_SOURCE = int(os.getenv("MAX_ARTICLES_PER_SOURCE", "50"))
+POLL_INTERVAL_SECS = 5  # frecuencia con la que se revisan solicitudes de la app
+
+
+def log(message: str):
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {message}", flush=True)
+
+
+class IngestionDaemon:
+    """Único dueño de la planificación de escaneos.
+
+    Cada `interval` segundos descarga solo las fuentes vencidas según
+    PollScheduler; un escaneo pedido desde la app descarga todas. Usa un
+    candado en la base de datos (ScanLock), así que aunque haya varios
+    procesos (este servicio, api_endpoint.py en GitHub Actions) solo corre un
+    escaneo a la vez.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, interval: int = SCAN_INTERVAL_SECS,
+                 max_articles: int = MAX_ARTICLES_PER_SOURCE):
+        self.db = CTIDatabase(db_path)
+        self.processor = RSSProcessor(self.db)
+        self.lock = ScanLock(db_path)
+        self.interval = interval
+        self.max_articles = max_articles
+        self.last_scan_started = 0.0
+
+    def scan_requested(self) -> bool:
+        """¿Pidió la app un escaneo después del último que corrimos?"""
+        requested_at = self.db.get_ingest_status().get('scan_requested_at')
+        return bool(requested_at) and float(requested_at) > self.last_scan_started
+
+    def run_scan(self, force: bool = False):
+        """Escanea las fuentes vencidas (todas con `force`).
+
+        Las fuentes con el circuito abierto se omiten incluso con `force`.
+        Retorna los resultados o None si otro proceso tiene el candado.
+        """
+        scheduler = self.processor.scheduler
+        sources = scheduler.without_open_circuits(self.db.get_sources())
+        if not force:
+            sources = scheduler.due_sources(sources)
+        if sources.empty:
+            return {}
+
+        if not self.lock.acquire():
+            holder = self.lock.holder()
+            log(f"⏭️  Escaneo omitido: otro proceso lo está ejecutando ({holder[0] if holder else '?'})")
+            return None
+
+        self.last_scan_started = time.time()
+        try:
+            self.db.set_ingest_status(last_scan_started=self.last_scan_started)
+            results = self.processor.fetch_all_feeds(sources, max_articles=self.max_articles)
+
+            names = dict(zip(sources['id'], sources['name']))
+            total_new = 0
+            for source_id, (new_count, error) in results.items():
+                if error:
+                    log(f"   ❌ {names.get(source_id, source_id)}: {error}")
+                else:
+                    total_new += new_count
+
+            stats = self.processor.scan_stats
+            unchanged = stats.get('not_modified', 0) + stats.get('unchanged', 0)
+            self.db.set_ingest_status(
+                last_scan_finished=time.time(),
+                last_scan_new=total_new,
+                last_scan_sources=len(results),
+                last_scan_unchanged=unchanged
+            )
+            log(f"✅ Escaneo completado: {total_new} artículos nuevos de {len(results)} fuentes "
+                f"({unchanged} sin cambios: {stats.get('not_modified', 0)} HTTP 304, "
+                f"{stats.get('unchanged', 0)} mismo contenido)")
+            if self.db.maintain_search_index():
+                log("🔎 Índice de búsqueda FTS optimizado")
+            return results
+        finally:
+            self.lock.release()
+
+    def run_forever(self):
+        log(f"🚀 Servicio de ingesta iniciado (revisión cada {self.interval}s, {self.max_articles} artículos por fuente)")
+        # La traducción es asíncrona: el hilo informa la caché por lote
+        start_translation_worker(self.db.db_path, report=log)
+        next_scan_at = 0.0
+        while True:
+            requested = self.scan_requested()
+            if time.time() >= next_scan_at or requested:
+                try:
+                    self.run_scan(force=requested)
+                except Exception as e:
+                    log(f"❌ Error en el escaneo: {e}")
+                next_scan_at = time.time() + self.interval
+            time.sleep(POLL_INTERVAL_SECS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de ingesta RSS de la plataforma CTI")
+    parser.add_argument("--db", default=DB_PATH, help="Ruta de la base de datos SQLite")
+    parser.add_argument("--interval", type=int, default=SCAN_INTERVAL_SECS, help="Segundos entre revisiones de fuentes vencidas")
+    parser.add_argument("--max-articles", type=int, default=MAX_ARTICLES_PER_SOURCE,
+                        help="Artículos a ingerir por fuente")
+    parser.add_argument("--once", action="store_true", help="Ejecutar un solo escaneo y salir")
+    args = parser.parse_args()
+
+    daemon = IngestionDaemon(args.db, interval=args.interval, max_articles=args.max_articles)
+    if args.once:
+        daemon.run_scan(force=True)
+        worker = TranslationWorker(args.db)
+        stats_before = worker.engine.cache.snapshot_stats()
+        translated = worker.drain()
+        log(f"🌐 Traducidos {translated} artículos pendientes · "
+            f"{worker.engine.cache.stats_summary(since=stats_before)}")
+        return
+
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        log("Servicio detenido")
+
+
+if __name__ == "__main__":
+    main()
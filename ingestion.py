@@ -0,0 +1,182 @@
+"""
+Procesamiento de feeds RSS: filtrado, extracción de IOCs y clasificación
+Compartido por la app de Streamlit y el servicio de ingesta
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from classification import KeywordMatcher
+from database import CTIDatabase
+from dedup import KnownArticleFilter
+from feed_fetcher import ConcurrentFeedFetcher
+from ioc_extraction import IOCExtractor
+from scheduler import PollScheduler
+from translation import get_translation_engine, wake_translation_worker
+
+# Hora de Latinoamérica (UTC-5 para Colombia, México, Perú, etc.)
+LATAM_TZ = timezone(timedelta(hours=-5))
+
+# Palabras clave que indican contenido no deseado (eventos, webinars, anuncios)
+EXCLUDED_KEYWORDS = KeywordMatcher([
+    'virtual event', 'evento virtual', 'webinar', 'register now', 'regístrate',
+    'registration', 'registro', 'view agenda', 'ver agenda', 'save the date',
+    'join us', 'únete', 'conference', 'conferencia', 'summit', 'looking ahead to',
+    'outlook 20', 'predictions for', 'predicciones', 'forecast', 'próximamente',
+    'coming soon', 'save your spot', 'rsvp', 'attendance', 'asistencia'
+])
+
+# Palabras clave de ciberseguridad que hacen relevante un artículo
+RELEVANT_KEYWORDS = KeywordMatcher([
+    'vulnerability', 'vulnerabilidad', 'exploit', 'breach', 'brecha', 'hack',
+    'malware', 'ransomware', 'phishing', 'attack', 'ataque', 'threat', 'amenaza',
+    'cve-', 'zero-day', 'patch', 'parche', 'backdoor', 'trojan', 'apt',
+    'data leak', 'filtración', 'security flaw', 'fallo de seguridad', 'compromise',
+    'compromiso', 'botnet', 'ddos', 'injection', 'inyección', 'credential',
+    'credencial', 'password', 'contraseña', 'authentication', 'autenticación'
+])
+
+
+def rejection_reason(title: str, summary: str):
+    """Motivo para descartar una entrada (evento/anuncio o sin tema de seguridad), o None"""
+    text_to_check = f"{title} {summary}".lower()
+    if EXCLUDED_KEYWORDS.matches(text_to_check):
+        return "Filtrado: evento/anuncio"
+    if len(text_to_check) > 50 and not RELEVANT_KEYWORDS.matches(text_to_check):
+        return "Filtrado: sin contenido relevante de seguridad"
+    return None
+
+
+# Clase para procesar RSS feeds
+class RSSProcessor:
+    def __init__(self, db: CTIDatabase):
+        self.db = db
+        self.ioc_extractor = IOCExtractor()
+        self.known_filter = KnownArticleFilter(self.create_fingerprint)
+        self.scheduler = PollScheduler(db.db_path)
+        self.translation_cache = get_translation_engine(db.db_path).cache
+        self.scan_stats = {}
+    
+    def create_fingerprint(self, title: str, url: str) -> str:
+        data = f"{title}_{url}".encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+    
+    def filter_new_entries(self, entries) -> list:
+        """Descartar entradas ya almacenadas con una sola consulta por lote"""
+        conn = self.db.get_connection()
+        try:
+            return self.known_filter.filter_new(conn, entries)
+        finally:
+            conn.close()
+    
+    def fetch_all_feeds(self, sources: pd.DataFrame, max_articles: int = 10,
+                        max_workers: int = None, per_host_limit: int = None) -> Dict[int, tuple]:
+        """Descargar todas las fuentes en paralelo y procesar cada feed al llegar.
+        
+        Retorna {source_id: (new_count, error)}. `self.scan_stats` cuenta
+        cuántas fuentes se omitieron por no tener cambios.
+        """
+        fetcher = ConcurrentFeedFetcher(max_workers=max_workers, per_host_limit=per_host_limit)
+        self.scan_stats = {'ok': 0, 'not_modified': 0, 'unchanged': 0, 'error': 0}
+        requests_ = []
+        for _, source in sources.iterrows():
+            validators = {key: source[key] for key in ('etag', 'last_modified', 'content_hash')
+                          if key in source and pd.notna(source[key])}
+            requests_.append((int(source['id']), source['url'], validators))
+        
+        results = {}
+        for source_id, result in fetcher.fetch_all(requests_):
+            self.scan_stats[result.status] += 1
+            results[source_id] = self.handle_fetch_result(source_id, result, max_articles)
+        return results
+    
+    def handle_fetch_result(self, source_id: int, result, max_articles: int) -> tuple:
+        """Procesar una descarga. Si el feed no cambió no se toca ninguna entrada.
+        
+        En cualquier caso se registra la salud de la fuente y se planifica su
+        próxima consulta.
+        """
+        error = None
+        try:
+            if result.status == 'error':
+                error = result.error
+                return 0, error
+            new_count = 0
+            if not result.skipped:
+                new_count = self.process_feed_entries(source_id, result.feed.entries[:max_articles])
+            self.db.update_source_validators(source_id, result.etag, result.last_modified,
+                                             result.content_hash)
+            self.db.update_source_fetch_time(source_id)
+            return new_count, None
+        except Exception as e:
+            error = str(e)
+            return 0, error
+        finally:
+            self.scheduler.record_result(source_id, result.latency, error)
+    
+    def process_feed_entries(self, source_id: int, entries) -> int:
+        """Procesar las entradas ya descargadas de un feed. Retorna artículos nuevos.
+        
+        Se descartan eventos/webinars, entradas sin tema de seguridad y
+        fechas futuras (con margen de 1 día por zonas horarias).
+        """
+        articles = []
+        max_date = datetime.now(LATAM_TZ) + timedelta(days=1)
+        for entry in self.filter_new_entries(entries):
+            title = entry.get('title', 'Sin título')
+            link = entry.get('link', '')
+            summary = entry.get('summary', entry.get('description', ''))
+            
+            # Filtrar contenido no relevante (eventos, webinars, anuncios)
+            if rejection_reason(title, summary):
+                continue
+            
+            # Limpiar HTML del summary
+            if summary:
+                summary = BeautifulSoup(summary, 'html.parser').get_text()[:500]
+            
+            content = entry.get('content', [{}])[0].get('value', summary) if 'content' in entry else summary
+            if content:
+                content = BeautifulSoup(content, 'html.parser').get_text()[:2000]
+            
+            published = entry.get('published_parsed', entry.get('updated_parsed', None))
+            if published:
+                published = datetime(*published[:6]).replace(tzinfo=timezone.utc).astimezone(LATAM_TZ)
+                if published > max_date:
+                    continue
+            else:
+                published = datetime.now()
+            
+            fingerprint = self.create_fingerprint(title, link)
+            
+            # Extraer IOCs
+            full_text = f"{title} {content}"
+            iocs = self.ioc_extractor.extract_iocs(full_text)
+            iocs_str = ','.join(iocs) if iocs else ''
+            
+            # Tags
+            tags = ['threat_intel']
+            if iocs:
+                tags.append('iocs')
+            tags_str = ','.join(tags)
+            
+            articles.append((
+                source_id, title, summary, content, link,
+                published, fingerprint, iocs_str, tags_str
+            ))
+        
+        # Guardar todo el feed en una transacción, en idioma original;
+        # la traducción ocurre en segundo plano
+        new_count = 0
+        outcomes = self.db.add_articles(articles, translation_status='pending')
+        for article_data, inserted in zip(articles, outcomes):
+            if inserted:
+                self.known_filter.mark_known(article_data[4], article_data[6])
+                new_count += 1
+        
+        if new_count:
+            wake_translation_worker(self.db.db_path)
+        return new_count
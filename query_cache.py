@@ -0,0 +1,143 @@
+"""
+Caché de consultas compartida por todas las sesiones de Streamlit del proceso
+Se invalida con contadores de generación que los triggers suben en cada escritura
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+# Configuración (sobrescribible por variables de entorno)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Los filtros "últimos N días" dependen de la hora: sin ingesta nueva igual caducan
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", os.getenv("COUNT_CACHE_TTL", "60")))
+
+GENERATION_TRIGGERS = ("articles_generation_ai", "articles_generation_ad", "articles_generation_au",
+                       "sources_generation_ai", "sources_generation_ad", "sources_generation_au",
+                       "watchlist_generation_ai", "watchlist_generation_ad", "watchlist_generation_au")
+
+_BUMP = "UPDATE data_generation SET value = value + 1 WHERE name = '{name}'"
+
+GENERATION_NAMES = ('articles', 'sources', 'watchlist')
+
+GENERATION_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS data_generation (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    # Cualquier escritura en `articles` (ingesta, traducción, reclasificación...)
+    f"CREATE TRIGGER IF NOT EXISTS articles_generation_ai AFTER INSERT ON articles BEGIN {_BUMP.format(name='articles')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS articles_generation_ad AFTER DELETE ON articles BEGIN {_BUMP.format(name='articles')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS articles_generation_au AFTER UPDATE ON articles BEGIN {_BUMP.format(name='articles')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS sources_generation_ai AFTER INSERT ON sources BEGIN {_BUMP.format(name='sources')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS sources_generation_ad AFTER DELETE ON sources BEGIN {_BUMP.format(name='sources')}; END",
+    # Cada descarga actualiza `sources` (last_fetched, validadores, planificación):
+    # las consultas de artículos solo dependen del nombre de la fuente
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sources_generation_au AFTER UPDATE ON sources BEGIN
+      {_BUMP.format(name='sources')};
+      {_BUMP.format(name='articles')} AND old.name IS NOT new.name;
+    END
+    """,
+    # Indicadores vigilados: Watchlist (watchlist.py) se recarga solo cuando cambia
+    f"CREATE TRIGGER IF NOT EXISTS watchlist_generation_ai AFTER INSERT ON watchlist BEGIN {_BUMP.format(name='watchlist')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS watchlist_generation_ad AFTER DELETE ON watchlist BEGIN {_BUMP.format(name='watchlist')}; END",
+    f"CREATE TRIGGER IF NOT EXISTS watchlist_generation_au AFTER UPDATE ON watchlist BEGIN {_BUMP.format(name='watchlist')}; END",
+)
+
+
+def ensure_data_generation(conn: sqlite3.Connection):
+    """Crea `data_generation` y los triggers que la suben.
+
+    Las filas iniciales solo se insertan si faltan: así un arranque normal
+    no pide el candado de escritura (la ingesta puede estar escribiendo).
+    """
+    for statement in GENERATION_DDL:
+        conn.execute(statement)
+    if set(read_generations(conn)) != set(GENERATION_NAMES):
+        conn.executemany("INSERT OR IGNORE INTO data_generation (name, value) VALUES (?, 0)",
+                         [(name,) for name in GENERATION_NAMES])
+    conn.commit()
+
+
+def read_generations(conn: sqlite3.Connection) -> dict:
+    """{'articles': n, 'sources': m, 'watchlist': w}: cambian con cada commit que toca esas tablas"""
+    return dict(conn.execute("SELECT name, value FROM data_generation").fetchall())
+
+
+def _result_size(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=True, deep=True).sum())
+    return sys.getsizeof(result)
+
+
+class QueryCache:
+    """LRU acotado en entradas y en bytes.
+
+    Cada entrada guarda la generación de datos con la que se calculó; si la
+    generación actual es otra (hubo ingesta) o pasó QUERY_CACHE_TTL, se
+    descarta. Los DataFrames se entregan como copia para que una sesión no
+    modifique el resultado que ve otra.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 max_bytes: int = QUERY_CACHE_MAX_BYTES, ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (generation, expires_at, size, result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        """Resultado cacheado o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation or entry[1] < time.time():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[3]
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    def put(self, key, generation, result):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        stored = result.copy() if isinstance(result, pd.DataFrame) else result
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (generation, time.time() + self.ttl, size, stored)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# Una sola instancia por proceso: la comparten todas las sesiones de Streamlit
+query_cache = QueryCache()
@@ -0,0 +1,207 @@
+"""
+Revisión de planes de consulta de CTIDatabase
+Genera una base sintética grande, registra cada sentencia que emite CTIDatabase
+y falla si alguna recorre completa una tabla grande o uno de sus índices (EXPLAIN QUERY PLAN)
+"""
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import CTIDatabase
+from query_cache import query_cache
+from watchlist import HITS_PER_INDICATOR_SQL, LOAD_SQL as WATCHLIST_LOAD_SQL
+
+DEFAULT_ROWS = 500_000
+
+# Tablas que crecen con el corpus: recorrerlas sin índice es una regresión.
+# Las de configuración y los agregados (unos cientos de filas) pueden recorrerse.
+LARGE_TABLES = {
+    'articles', 'article_iocs', 'iocs', 'article_minhash', 'minhash_bands',
+    'watchlist', 'watchlist_hits', 'translation_cache', 'article_rollup',
+}
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+# "SCAN a USING COVERING INDEX idx" (SQLite >= 3.36) y "SCAN TABLE articles AS a USING INDEX idx" (anteriores)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?")
+# La sentencia termina en ORDER BY ... LIMIT (fuera de subconsultas)
+_ORDERED_LIMIT = re.compile(r"\bORDER BY\b[^()]*\bLIMIT\b[^()]*$", re.IGNORECASE)
+# Lecturas completas a propósito (ver watchlist.py); se comparan sin espacios repetidos ni LIMIT
+DELIBERATE_FULL_READS = tuple(' '.join(sql.split()) for sql in (WATCHLIST_LOAD_SQL, HITS_PER_INDICATOR_SQL))
+_SQL_KEYWORDS = {'where', 'on', 'join', 'left', 'inner', 'group', 'order', 'limit', 'set', 'values',
+                 'using', 'natural', 'cross', 'select'}
+
+
+def generate_database(path: str, n_articles: int = DEFAULT_ROWS, seed: int = 42):
+    """Base con `n_articles` artículos sintéticos repartidos en 3 años, con IOCs y clasificación"""
+    db = CTIDatabase(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    source_ids = [row[0] for row in conn.execute("SELECT id FROM sources")]
+    severities = ['critical', 'high', 'medium', 'low', 'info']
+    types = ['Ransomware', 'Malware', 'Vulnerabilidad', 'Phishing', 'Información']
+    words = ['ransomware', 'exploit', 'patch', 'botnet', 'phishing', 'apt', 'breach', 'zero-day']
+    tz = timezone(timedelta(hours=-5))
+    now = datetime.now(tz)
+
+    def rows(start, stop):
+        for i in range(start, stop):
+            published = now - timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+            yield (rng.choice(source_ids), f"{rng.choice(words)} campaign {i} {rng.choice(words)}",
+                   f"Resumen {i}", f"Contenido {i} {rng.choice(words)}", f"https://example.com/{i}",
+                   published.isoformat(), int(published.timestamp()), f"fp-{i}",
+                   f"10.0.{i % 256}.{i % 200}" if i % 10 == 0 else '', '',
+                   rng.choice(severities), rng.choice(types))
+
+    with conn:
+        for start in range(0, n_articles, 50_000):
+            conn.executemany("""
+            INSERT INTO articles (source_id, title, summary, content, url, published, published_ts,
+                                  fingerprint, iocs, tags, severity, threat_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows(start, min(n_articles, start + 50_000)))
+        # Historias: una de cada veinte es copia de la anterior
+        conn.execute("UPDATE articles SET cluster_id = CASE WHEN id % 20 = 0 THEN id - 1 ELSE id END")
+        conn.execute("""
+        INSERT OR IGNORE INTO iocs (value, type, first_seen, last_seen)
+        SELECT DISTINCT iocs, 'ip', published, published FROM articles WHERE iocs != ''
+        """)
+        conn.execute("""
+        INSERT INTO article_iocs (article_id, ioc_id)
+        SELECT a.id, i.id FROM articles a JOIN iocs i ON i.value = a.iocs WHERE a.iocs != ''
+        """)
+    conn.close()
+    return db
+
+
+def capture_statements(db: CTIDatabase) -> list:
+    """Ejecuta las lecturas de CTIDatabase con combinaciones de filtros y devuelve su SQL"""
+    statements = []
+    conn = db.get_connection()
+    query_cache.clear()
+    conn.set_trace_callback(statements.append)
+    try:
+        conn_probe = sqlite3.connect(db.db_path)
+        source_id, article_id = conn_probe.execute(
+            "SELECT source_id, id FROM articles ORDER BY id DESC LIMIT 1").fetchone()
+        ioc_value = conn_probe.execute("SELECT value FROM iocs LIMIT 1").fetchone()
+        conn_probe.close()
+
+        db.get_sources()
+        filters = [{}, {'source_id': source_id}, {'severity': 'critical'}, {'days': 7},
+                   {'source_id': source_id, 'severity': 'high', 'days': 30},
+                   {'collapse_clusters': True}, {'days': 1, 'collapse_clusters': True},
+                   {'search_query': 'ransomware'}, {'search_query': 'exploit', 'days': 7}]
+        for kwargs in filters:
+            page = db.get_article_list(limit=25, **kwargs)
+            db.get_article_list(limit=25, cursor=db.next_page_cursor(page), **kwargs)
+            db.count_articles(**kwargs)
+        db.get_articles(limit=25)
+        db.get_article_detail(article_id)
+        db.get_cluster_members(article_id)
+        if ioc_value:
+            db.find_articles_by_ioc(ioc_value[0])
+        db.get_classification_counts()
+        db.get_classification_counts(days=30)
+        db.get_ioc_type_counts()
+        db.get_daily_counts()
+        db.get_daily_counts(90)
+        db.get_source_counts()
+        db.get_dashboard_totals()
+        db.get_article_total()
+        db.get_article_total(source_id)
+        db.get_last_ingest_at()
+        db.get_watchlist_hits()
+        db.get_source_health()
+        db.get_ingest_status()
+        db.get_source_validators(source_id)
+        # Escritura: inserción de un artículo nuevo (clustering, IOCs, watchlist)
+        db.add_articles([(source_id, "Ransomware exploit patch campaign", "Resumen", "Contenido 10.9.8.7",
+                          "https://example.com/plan-check", datetime.now(), "fp-plan-check", "10.9.8.7", "")])
+    finally:
+        conn.set_trace_callback(None)
+    # Sin sentencias de control ni las internas de los triggers
+    seen, unique = set(), []
+    for sql in statements:
+        text = sql.strip()
+        if not text or text.startswith('--') or text.upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA')):
+            continue
+        if text not in seen:
+            seen.add(text)
+            unique.append(text)
+    return unique
+
+
+def _aliases(sql: str) -> dict:
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn: sqlite3.Connection, sql: str) -> tuple:
+    """(tablas grandes recorridas completas, plan) de una sentencia.
+
+    Cuenta tanto el recorrido de la tabla como el de cualquiera de sus
+    índices. Solo se acepta el que está acotado: en el nivel superior, sin
+    ordenar aparte (sin TEMP B-TREE) y con ORDER BY ... LIMIT, de modo que
+    el índice entrega las filas en orden y la consulta corta en el LIMIT.
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    plan = [row[3] for row in rows]
+    aliases = _aliases(sql)
+    bounded = bool(_ORDERED_LIMIT.search(sql.strip())) and not any('TEMP B-TREE' in d for d in plan)
+    scanned = []
+    for _, parent, _, detail in rows:
+        match = _SCAN.match(detail)
+        if not match:
+            continue
+        name, alias, index = match.groups()
+        table = name if alias else aliases.get(name, name)
+        if table not in LARGE_TABLES or (bounded and parent == 0):
+            continue
+        scanned.append(f"{table} ({index})" if index else table)
+    return scanned, plan
+
+
+def check(db: CTIDatabase) -> list:
+    """Sentencias con recorridos completos: [(sql, tablas, plan)]"""
+    conn = sqlite3.connect(db.db_path)
+    try:
+        problems = []
+        for sql in capture_statements(db):
+            if ' '.join(sql.split()).startswith(DELIBERATE_FULL_READS):
+                continue
+            scanned, plan = full_scans(conn, sql)
+            if scanned:
+                problems.append((sql, scanned, plan))
+        return problems
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    with tempfile.TemporaryDirectory() as tmp:
+        path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tmp, "plans.db")
+        start = time.perf_counter()
+        if os.path.exists(path):
+            db = CTIDatabase(path)
+        else:
+            db = generate_database(path, n_rows)
+            print(f"Base sintética de {n_rows} artículos: {time.perf_counter() - start:.0f}s")
+        problems = check(db)
+        for sql, scanned, plan in problems:
+            print(f"\n✗ Recorrido completo de {', '.join(scanned)}:\n  {' '.join(sql.split())[:300]}")
+            for detail in plan:
+                print(f"    {detail}")
+        if problems:
+            print(f"\n{len(problems)} sentencia(s) sin índice")
+            sys.exit(1)
+        print("✓ Ninguna sentencia recorre completa una tabla grande")
@@ -0,0 +1,325 @@
+"""
+Agregados del Dashboard mantenidos por triggers
+Artículos por día × fuente × criticidad × tipo (y sin el día, para los totales;
+y solo por día, para la serie diaria), menciones de IOCs por día × fuente × tipo y contadores del corpus
+"""
+import sqlite3
+import time
+
+import pandas as pd
+
+from search_index import get_schema_version, set_schema_version
+
+# Subir al cambiar las tablas o los triggers: fuerza la reconstrucción
+ROLLUP_VERSION = 5
+ROLLUP_TABLES = ("article_rollup", "article_totals", "article_daily", "ioc_rollup", "corpus_counters")
+ROLLUP_TRIGGERS = ("articles_rollup_ai", "articles_rollup_ad", "articles_rollup_au",
+                   "article_iocs_rollup_ai", "article_iocs_rollup_ad",
+                   "articles_counters_ai", "articles_counters_ad", "articles_counters_au",
+                   "articles_stories_ai", "articles_stories_ad", "articles_stories_au")
+MTTD_SAMPLE_SIZE = 1000   # publicaciones más recientes sobre las que se mide la mediana entre ellas
+
+# Claves sin NULL para que la clave primaria agrupe: '' = sin fecha / sin clasificar
+_DAY = "COALESCE(date({p}.published_ts, 'unixepoch'), '')"
+_ARTICLE_KEY = "COALESCE({p}.source_id, 0), COALESCE({p}.severity, ''), COALESCE({p}.threat_type, '')"
+_HAS_IOCS = "(COALESCE({p}.iocs, '') != '')"
+_IOC_KEY = ("COALESCE((SELECT date(published_ts, 'unixepoch') FROM articles WHERE id = {p}.article_id), ''), "
+            "COALESCE((SELECT source_id FROM articles WHERE id = {p}.article_id), 0), "
+            "COALESCE((SELECT type FROM iocs WHERE id = {p}.ioc_id), 'other')")
+_EPOCH_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+# Representante de su historia (ver clustering.py): lo que muestra el feed agrupado
+_IS_STORY = "({p}.cluster_id IS NULL OR {p}.cluster_id = {p}.id)"
+
+# Claves de `corpus_counters`
+TOTAL_ARTICLES = 'articles'
+TOTAL_STORIES = 'stories'
+LAST_INGEST_AT = 'last_ingest_at'
+
+
+def source_counter(source_id: int) -> str:
+    return f"articles:source:{int(source_id)}"
+
+
+def story_counter(source_id: int = None) -> str:
+    return TOTAL_STORIES if source_id is None else f"stories:source:{int(source_id)}"
+
+
+def _add_article(p: str, sign: int) -> str:
+    values = f"{_ARTICLE_KEY.format(p=p)}, {sign}, {sign} * {_HAS_IOCS.format(p=p)}"
+    return f"""
+      INSERT INTO article_rollup (day, source_id, severity, threat_type, articles, with_iocs)
+      VALUES ({_DAY.format(p=p)}, {values})
+      ON CONFLICT (day, source_id, severity, threat_type) DO UPDATE SET
+        articles = articles + excluded.articles,
+        with_iocs = with_iocs + excluded.with_iocs;
+      INSERT INTO article_totals (source_id, severity, threat_type, articles, with_iocs)
+      VALUES ({values})
+      ON CONFLICT (source_id, severity, threat_type) DO UPDATE SET
+        articles = articles + excluded.articles,
+        with_iocs = with_iocs + excluded.with_iocs;
+      INSERT INTO article_daily (day, articles) VALUES ({_DAY.format(p=p)}, {sign})
+      ON CONFLICT (day) DO UPDATE SET articles = articles + excluded.articles;
+    """
+
+
+def _add_count(name_sql: str, delta) -> str:
+    return f"""
+      INSERT INTO corpus_counters (name, value) VALUES ({name_sql}, {delta})
+      ON CONFLICT (name) DO UPDATE SET value = value + excluded.value;
+    """
+
+
+def _source_key(p: str, prefix: str = 'articles') -> str:
+    return f"'{prefix}:source:' || COALESCE({p}.source_id, 0)"
+
+
+def _add_ioc(p: str, sign: int) -> str:
+    return f"""
+      INSERT INTO ioc_rollup (day, source_id, ioc_type, mentions)
+      VALUES ({_IOC_KEY.format(p=p)}, {sign})
+      ON CONFLICT (day, source_id, ioc_type) DO UPDATE SET mentions = mentions + excluded.mentions;
+    """
+
+
+ROLLUP_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS article_rollup (
+        day TEXT NOT NULL,
+        source_id INTEGER NOT NULL,
+        severity TEXT NOT NULL,
+        threat_type TEXT NOT NULL,
+        articles INTEGER NOT NULL,
+        with_iocs INTEGER NOT NULL,
+        PRIMARY KEY (day, source_id, severity, threat_type)
+    ) WITHOUT ROWID
+    """,
+    # Lo mismo sin el día: los totales del corpus leen unos cientos de filas
+    """
+    CREATE TABLE IF NOT EXISTS article_totals (
+        source_id INTEGER NOT NULL,
+        severity TEXT NOT NULL,
+        threat_type TEXT NOT NULL,
+        articles INTEGER NOT NULL,
+        with_iocs INTEGER NOT NULL,
+        PRIMARY KEY (source_id, severity, threat_type)
+    ) WITHOUT ROWID
+    """,
+    # Solo el día: la serie diaria lee una fila por día
+    """
+    CREATE TABLE IF NOT EXISTS article_daily (
+        day TEXT PRIMARY KEY,
+        articles INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ioc_rollup (
+        day TEXT NOT NULL,
+        source_id INTEGER NOT NULL,
+        ioc_type TEXT NOT NULL,
+        mentions INTEGER NOT NULL,
+        PRIMARY KEY (day, source_id, ioc_type)
+    ) WITHOUT ROWID
+    """,
+    f"CREATE TRIGGER articles_rollup_ai AFTER INSERT ON articles BEGIN {_add_article('new', 1)} END",
+    f"CREATE TRIGGER articles_rollup_ad AFTER DELETE ON articles BEGIN {_add_article('old', -1)} END",
+    # Solo las columnas que forman la clave: traducir o agrupar no toca los agregados
+    f"""
+    CREATE TRIGGER articles_rollup_au
+    AFTER UPDATE OF published_ts, source_id, severity, threat_type, iocs ON articles
+    WHEN old.published_ts IS NOT new.published_ts OR old.source_id IS NOT new.source_id
+      OR old.severity IS NOT new.severity OR old.threat_type IS NOT new.threat_type
+      OR old.iocs IS NOT new.iocs
+    BEGIN {_add_article('old', -1)} {_add_article('new', 1)} END
+    """,
+    f"CREATE TRIGGER article_iocs_rollup_ai AFTER INSERT ON article_iocs BEGIN {_add_ioc('new', 1)} END",
+    f"CREATE TRIGGER article_iocs_rollup_ad AFTER DELETE ON article_iocs BEGIN {_add_ioc('old', -1)} END",
+    # Contadores que se leen con una sola búsqueda por clave primaria
+    """
+    CREATE TABLE IF NOT EXISTS corpus_counters (
+        name TEXT PRIMARY KEY,
+        value REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TRIGGER articles_counters_ai AFTER INSERT ON articles BEGIN
+      {_add_count(f"'{TOTAL_ARTICLES}'", 1)} {_add_count(_source_key('new'), 1)}
+      INSERT INTO corpus_counters (name, value) VALUES ('{LAST_INGEST_AT}', {_EPOCH_NOW})
+      ON CONFLICT (name) DO UPDATE SET value = excluded.value;
+    END
+    """,
+    f"""
+    CREATE TRIGGER articles_counters_ad AFTER DELETE ON articles BEGIN
+      {_add_count(f"'{TOTAL_ARTICLES}'", -1)} {_add_count(_source_key('old'), -1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER articles_counters_au AFTER UPDATE OF source_id ON articles
+    WHEN old.source_id IS NOT new.source_id
+    BEGIN {_add_count(_source_key('old'), -1)} {_add_count(_source_key('new'), 1)} END
+    """,
+    # Historias: al insertar el artículo es su propio representante hasta que
+    # assign_cluster lo une a otra (UPDATE de cluster_id)
+    f"""
+    CREATE TRIGGER articles_stories_ai AFTER INSERT ON articles BEGIN
+      {_add_count(f"'{TOTAL_STORIES}'", _IS_STORY.format(p='new'))}
+      {_add_count(_source_key('new', 'stories'), _IS_STORY.format(p='new'))}
+    END
+    """,
+    f"""
+    CREATE TRIGGER articles_stories_ad AFTER DELETE ON articles BEGIN
+      {_add_count(f"'{TOTAL_STORIES}'", f"-{_IS_STORY.format(p='old')}")}
+      {_add_count(_source_key('old', 'stories'), f"-{_IS_STORY.format(p='old')}")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER articles_stories_au AFTER UPDATE OF cluster_id, source_id ON articles
+    WHEN old.cluster_id IS NOT new.cluster_id OR old.source_id IS NOT new.source_id
+    BEGIN
+      {_add_count(f"'{TOTAL_STORIES}'", f"{_IS_STORY.format(p='new')} - {_IS_STORY.format(p='old')}")}
+      {_add_count(_source_key('old', 'stories'), f"-{_IS_STORY.format(p='old')}")}
+      {_add_count(_source_key('new', 'stories'), _IS_STORY.format(p='new'))}
+    END
+    """,
+)
+
+
+def rollups_present(conn: sqlite3.Connection) -> bool:
+    """¿Existen las tablas de agregados y todos sus triggers?"""
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    return all(name in names for name in ROLLUP_TABLES + ROLLUP_TRIGGERS)
+
+
+def rebuild_rollups(conn: sqlite3.Connection):
+    """Crea tablas y triggers y recalcula los agregados desde cero (no hace commit)"""
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    for table in ROLLUP_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in ROLLUP_DDL:
+        conn.execute(statement)
+    conn.execute(f"""
+    INSERT INTO article_rollup (day, source_id, severity, threat_type, articles, with_iocs)
+    SELECT {_DAY.format(p='a')}, {_ARTICLE_KEY.format(p='a')}, COUNT(*), SUM({_HAS_IOCS.format(p='a')})
+    FROM articles a GROUP BY 1, 2, 3, 4
+    """)
+    conn.execute("""
+    INSERT INTO article_totals (source_id, severity, threat_type, articles, with_iocs)
+    SELECT source_id, severity, threat_type, SUM(articles), SUM(with_iocs)
+    FROM article_rollup GROUP BY 1, 2, 3
+    """)
+    conn.execute("""
+    INSERT INTO article_daily (day, articles)
+    SELECT day, SUM(articles) FROM article_rollup GROUP BY day
+    """)
+    conn.execute(f"""
+    INSERT INTO ioc_rollup (day, source_id, ioc_type, mentions)
+    SELECT {_DAY.format(p='a')}, COALESCE(a.source_id, 0), i.type, COUNT(*)
+    FROM article_iocs ai
+    JOIN articles a ON a.id = ai.article_id
+    JOIN iocs i ON i.id = ai.ioc_id
+    GROUP BY 1, 2, 3
+    """)
+    conn.execute(f"""
+    INSERT INTO corpus_counters (name, value)
+    SELECT '{TOTAL_ARTICLES}', COUNT(*) FROM articles
+    UNION ALL
+    SELECT {_source_key('a')}, COUNT(*) FROM articles a GROUP BY a.source_id
+    UNION ALL
+    SELECT '{TOTAL_STORIES}', COUNT(*) FROM articles a WHERE {_IS_STORY.format(p='a')}
+    UNION ALL
+    SELECT {_source_key('a', 'stories')}, COUNT(*) FROM articles a
+    WHERE {_IS_STORY.format(p='a')} GROUP BY a.source_id
+    UNION ALL
+    SELECT '{LAST_INGEST_AT}', CAST(strftime('%s', MAX(created_at)) AS REAL) FROM articles
+    HAVING MAX(created_at) IS NOT NULL
+    """)
+    set_schema_version(conn, 'rollups', ROLLUP_VERSION)
+
+
+def ensure_rollup_tables(conn: sqlite3.Connection):
+    """Deja los agregados listos; solo se recalculan si faltan o cambió su versión"""
+    if get_schema_version(conn, 'rollups') != ROLLUP_VERSION or not rollups_present(conn):
+        rebuild_rollups(conn)
+    conn.commit()
+
+
+def read_counter(conn: sqlite3.Connection, name: str, default=0):
+    """Valor de un contador de `corpus_counters` (una búsqueda por clave primaria)"""
+    row = conn.execute("SELECT value FROM corpus_counters WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+def _since(days) -> tuple:
+    if not days:
+        return "", []
+    return " AND r.day >= date('now', '-' || ? || ' days')", [int(days)]
+
+
+def classification_counts(conn: sqlite3.Connection, days=None) -> pd.DataFrame:
+    """Artículos por (severity, threat_type); NULL si no están clasificados"""
+    where, params = _since(days)
+    table = "article_rollup" if days else "article_totals"
+    return pd.read_sql_query(f"""
+    SELECT NULLIF(r.severity, '') AS severity, NULLIF(r.threat_type, '') AS threat_type,
+           SUM(r.articles) AS count
+    FROM {table} r WHERE r.articles != 0{where}
+    GROUP BY r.severity, r.threat_type HAVING count > 0 ORDER BY count DESC
+    """, conn, params=params)
+
+
+def daily_counts(conn: sqlite3.Connection, days=None) -> pd.DataFrame:
+    """Artículos por día de publicación (UTC)"""
+    where, params = _since(days)
+    return pd.read_sql_query(f"""
+    SELECT r.day, SUM(r.articles) AS count
+    FROM article_daily r WHERE r.day != ''{where}
+    GROUP BY r.day HAVING count > 0 ORDER BY r.day
+    """, conn, params=params)
+
+
+def source_counts(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Artículos por fuente, de más a menos"""
+    return pd.read_sql_query("""
+    SELECT COALESCE(s.name, 'Desconocida') AS source_name, SUM(r.articles) AS count
+    FROM article_totals r LEFT JOIN sources s ON s.id = r.source_id
+    GROUP BY r.source_id HAVING count > 0 ORDER BY count DESC
+    """, conn)
+
+
+def ioc_type_counts(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Menciones de IOCs por tipo"""
+    return pd.read_sql_query("""
+    SELECT ioc_type AS type, SUM(mentions) AS count
+    FROM ioc_rollup GROUP BY ioc_type HAVING count > 0 ORDER BY count DESC
+    """, conn)
+
+
+def dashboard_totals(conn: sqlite3.Connection) -> dict:
+    """Totales del Dashboard: corpus, con IOCs, últimas 24h / 7 días y mediana entre publicaciones.
+
+    Los totales salen de `article_totals`; las ventanas y la mediana (sobre
+    las MTTD_SAMPLE_SIZE publicaciones más recientes) leen solo artículos
+    recientes por idx_articles_published_ts, así que el costo no crece con
+    el histórico.
+    """
+    now = time.time()
+    total, with_iocs = conn.execute(
+        "SELECT TOTAL(articles), TOTAL(with_iocs) FROM article_totals"
+    ).fetchone()
+    last_7d, last_24h = conn.execute(
+        "SELECT COUNT(*), TOTAL(published_ts >= ?) FROM articles WHERE published_ts >= ?",
+        (int(now - 86400), int(now - 7 * 86400))
+    ).fetchone()
+    recent = pd.Series([row[0] for row in conn.execute(
+        "SELECT published_ts FROM articles WHERE published_ts IS NOT NULL "
+        "ORDER BY published_ts DESC, id DESC LIMIT ?", (MTTD_SAMPLE_SIZE,)
+    )], dtype=float)
+    gaps = recent.sort_values().diff() / 3600
+    return {
+        'total': int(total),
+        'with_iocs': int(with_iocs),
+        'last_24h': int(last_24h),
+        'last_7d': int(last_7d),
+        'median_gap_hours': float(gaps.median()) if gaps.notna().any() else 0.0,
+    }
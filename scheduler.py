@@ -0,0 +1,145 @@
+"""
+Planificación adaptativa de descargas por fuente
+Cada fuente se consulta con una frecuencia acorde a lo que publica
+"""
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+from typing import Iterable, List
+
+import pandas as pd
+
+from db_pool import connect
+from source_health import open_circuits, record_fetch
+
+# Configuración (sobrescribible por variables de entorno)
+DEFAULT_DB_PATH = "cti_platform.db"
+POLL_MIN_INTERVAL_SECS = int(os.getenv("POLL_MIN_INTERVAL_SECS", "300"))
+POLL_MAX_INTERVAL_SECS = int(os.getenv("POLL_MAX_INTERVAL_SECS", "43200"))
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.1"))   # ±10% del intervalo
+POLL_HISTORY = 20          # publicaciones recientes usadas para estimar la tasa
+POLL_GAP_FRACTION = 0.5    # consultar dos veces por intervalo medio entre publicaciones
+
+
+def ensure_schedule_columns(conn: sqlite3.Connection):
+    """Agrega `sources.next_fetch_at` (epoch).
+
+    El historial de cada fuente se lee por idx_articles_source_published_ts
+    (creado junto con `articles.published_ts`).
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sources)")}
+    if 'next_fetch_at' not in columns:
+        # NULL = la fuente toca en el próximo escaneo
+        conn.execute("ALTER TABLE sources ADD COLUMN next_fetch_at REAL")
+    conn.commit()
+
+
+def parse_timestamp(value) -> float:
+    """Convierte un valor de `articles.published` a epoch; None si no se puede"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def poll_interval(published: Iterable[float], now: float = None,
+                  min_interval: int = POLL_MIN_INTERVAL_SECS,
+                  max_interval: int = POLL_MAX_INTERVAL_SECS) -> float:
+    """Intervalo de consulta a partir de las fechas de publicación recientes.
+
+    La tasa se mide desde la publicación más antigua considerada hasta
+    ahora, así que una fuente que dejó de publicar se va espaciando sola.
+    Sin historial suficiente se usa el mínimo.
+    """
+    now = now or time.time()
+    published = [ts for ts in published if ts is not None and ts <= now]
+    if len(published) < 2:
+        return float(min_interval)
+    mean_gap = (now - min(published)) / len(published)
+    return float(min(max_interval, max(min_interval, mean_gap * POLL_GAP_FRACTION)))
+
+
+class PollScheduler:
+    """Decide qué fuentes tocan en cada escaneo.
+
+    Tras cada descarga se guarda en `sources.next_fetch_at` la próxima hora
+    de consulta (última descarga + intervalo con jitter), así que la
+    planificación se comparte entre ingest_daemon.py y api_endpoint.py.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, min_interval: int = POLL_MIN_INTERVAL_SECS,
+                 max_interval: int = POLL_MAX_INTERVAL_SECS, jitter: float = POLL_JITTER):
+        self.db_path = db_path
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.jitter = jitter
+
+    def get_connection(self):
+        return connect(self.db_path)
+
+    def due_sources(self, sources: pd.DataFrame, now: float = None) -> pd.DataFrame:
+        """Filtra las fuentes cuya próxima consulta ya venció"""
+        if 'next_fetch_at' not in sources.columns:
+            return sources
+        now = now or time.time()
+        next_fetch = pd.to_numeric(sources['next_fetch_at'], errors='coerce')
+        return sources[next_fetch.isna() | (next_fetch <= now)]
+
+    def open_circuits(self, now: float = None) -> set:
+        """Fuentes en pausa por el circuit breaker: ni un escaneo forzado las descarga"""
+        conn = self.get_connection()
+        try:
+            return open_circuits(conn, now)
+        finally:
+            conn.close()
+
+    def without_open_circuits(self, sources: pd.DataFrame, now: float = None) -> pd.DataFrame:
+        """Quita las fuentes con el circuito abierto"""
+        paused = self.open_circuits(now)
+        return sources[~sources['id'].isin(paused)] if paused else sources
+
+    def recent_published(self, conn: sqlite3.Connection, source_id: int) -> List[float]:
+        rows = conn.execute(
+            "SELECT published_ts FROM articles WHERE source_id = ? AND published_ts IS NOT NULL "
+            "ORDER BY published_ts DESC LIMIT ?",
+            (int(source_id), POLL_HISTORY)
+        ).fetchall()
+        return [float(row[0]) for row in rows]
+
+    def schedule(self, source_id: int, now: float = None, backoff: float = 0.0) -> float:
+        """Calcula y guarda la próxima consulta de una fuente recién descargada.
+
+        `backoff` (pausa del circuit breaker) gana si es mayor que el intervalo.
+        """
+        now = now or time.time()
+        conn = self.get_connection()
+        try:
+            interval = poll_interval(self.recent_published(conn, source_id), now,
+                                     self.min_interval, self.max_interval)
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            next_fetch_at = now + max(interval, backoff)
+            conn.execute("UPDATE sources SET next_fetch_at = ? WHERE id = ?",
+                         (next_fetch_at, int(source_id)))
+            conn.commit()
+        finally:
+            conn.close()
+        return next_fetch_at
+
+    def record_result(self, source_id: int, latency: float = None, error: str = None,
+                      now: float = None) -> float:
+        """Actualiza `source_health` con una descarga y planifica la siguiente.
+
+        Una fuente que falla varias veces seguidas se consulta cada vez
+        menos (ver source_health.py) en lugar de reintentarse en cada escaneo.
+        """
+        now = now or time.time()
+        conn = self.get_connection()
+        try:
+            backoff = record_fetch(conn, source_id, latency, error, now)
+        finally:
+            conn.close()
+        return self.schedule(source_id, now, backoff)
@@ -0,0 +1,130 @@
+"""
+Índice de búsqueda FTS5 sobre `articles`
+Se detecta en cada arranque y solo se reconstruye cuando cambia su versión de esquema
+"""
+import os
+import sqlite3
+import time
+
+# Configuración (sobrescribible por variables de entorno)
+FTS_OPTIMIZE_INTERVAL_SECS = int(os.getenv("FTS_OPTIMIZE_INTERVAL_SECS", "86400"))
+FTS_AUTOMERGE = 8  # segmentos por nivel antes de fusionar (por defecto FTS5 usa 4)
+
+# Subir al cambiar columnas, tokenizer o triggers: fuerza la reconstrucción
+FTS_SCHEMA_VERSION = 2
+FTS_TABLE = "articles_fts"
+FTS_TRIGGERS = ("articles_ai", "articles_ad", "articles_au")
+
+FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE articles_fts
+    USING fts5(
+        title, summary, content, tags,
+        content='articles', content_rowid='id',
+        prefix='2 3',
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # Con tablas de contenido externo el borrado se hace con el comando
+    # 'delete' y los valores anteriores; un DELETE directo deja el índice
+    # desincronizado.
+    """
+    CREATE TRIGGER articles_ai AFTER INSERT ON articles BEGIN
+      INSERT INTO articles_fts(rowid, title, summary, content, tags)
+      VALUES (new.id, new.title, new.summary, new.content, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER articles_ad AFTER DELETE ON articles BEGIN
+      INSERT INTO articles_fts(articles_fts, rowid, title, summary, content, tags)
+      VALUES ('delete', old.id, old.title, old.summary, old.content, old.tags);
+    END
+    """,
+    # Solo las columnas indexadas: cambiar el estado de traducción u otras
+    # columnas no reescribe el índice
+    """
+    CREATE TRIGGER articles_au AFTER UPDATE OF title, summary, content, tags ON articles BEGIN
+      INSERT INTO articles_fts(articles_fts, rowid, title, summary, content, tags)
+      VALUES ('delete', old.id, old.title, old.summary, old.content, old.tags);
+      INSERT INTO articles_fts(rowid, title, summary, content, tags)
+      VALUES (new.id, new.title, new.summary, new.content, new.tags);
+    END
+    """,
+)
+
+
+def ensure_schema_versions(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_versions (
+        component TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """)
+
+
+def get_schema_version(conn: sqlite3.Connection, component: str) -> int:
+    ensure_schema_versions(conn)
+    row = conn.execute("SELECT version FROM schema_versions WHERE component = ?",
+                       (component,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_schema_version(conn: sqlite3.Connection, component: str, version: int):
+    conn.execute(
+        "INSERT OR REPLACE INTO schema_versions (component, version, updated_at) VALUES (?, ?, ?)",
+        (component, version, time.time())
+    )
+
+
+def fts_index_present(conn: sqlite3.Connection) -> bool:
+    """¿Existen la tabla FTS y sus tres triggers?"""
+    names = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name = ? OR (type = 'trigger' AND tbl_name = 'articles')",
+        (FTS_TABLE,)
+    )}
+    return FTS_TABLE in names and all(trigger in names for trigger in FTS_TRIGGERS)
+
+
+def rebuild_fts_index(conn: sqlite3.Connection):
+    """Crea de cero la tabla FTS, los triggers y el contenido indexado"""
+    for trigger in FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    for statement in FTS_DDL:
+        conn.execute(statement)
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('automerge', {FTS_AUTOMERGE})")
+    set_schema_version(conn, FTS_TABLE, FTS_SCHEMA_VERSION)
+
+
+def ensure_fts_index(conn: sqlite3.Connection) -> bool:
+    """Deja el índice FTS listo. Retorna False si SQLite no soporta FTS5.
+
+    Si la tabla y los triggers existen con la versión actual no se hace
+    nada, así que arrancar la app no reindexa el corpus.
+    """
+    def up_to_date():
+        return (get_schema_version(conn, FTS_TABLE) == FTS_SCHEMA_VERSION
+                and fts_index_present(conn))
+
+    try:
+        if not up_to_date():
+            # Otro proceso puede estar arrancando a la vez: revisar de nuevo
+            # con la base tomada para escritura
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            if not up_to_date():
+                rebuild_fts_index(conn)
+        conn.commit()
+        return True
+    except sqlite3.Error:
+        # Compilación de SQLite sin FTS5: búsqueda con LIKE
+        conn.rollback()
+        return False
+
+
+def optimize_fts_index(conn: sqlite3.Connection):
+    """Fusiona todos los segmentos del índice en uno (lecturas más rápidas)"""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    conn.commit()
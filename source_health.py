@@ -0,0 +1,90 @@
+"""
+Salud de las fuentes RSS y circuit breaker
+Fallos consecutivos, latencia y último error por fuente; las que fallan se espacian
+"""
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+# Configuración (sobrescribible por variables de entorno)
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_BASE_BACKOFF_SECS = int(os.getenv("CIRCUIT_BASE_BACKOFF_SECS", "900"))
+CIRCUIT_MAX_BACKOFF_SECS = int(os.getenv("CIRCUIT_MAX_BACKOFF_SECS", "86400"))
+LATENCY_EWMA_ALPHA = 0.3   # peso de la última descarga en la latencia media
+
+
+def ensure_source_health_table(conn: sqlite3.Connection):
+    """Crea `source_health` (una fila por fuente descargada al menos una vez)"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS source_health (
+        source_id INTEGER PRIMARY KEY,
+        consecutive_failures INTEGER NOT NULL DEFAULT 0,
+        last_latency_ms REAL,
+        avg_latency_ms REAL,
+        last_error TEXT,
+        last_success_at REAL,
+        last_failure_at REAL,
+        open_until REAL
+    )
+    """)
+    conn.commit()
+
+
+def circuit_backoff(consecutive_failures: int) -> float:
+    """Segundos de pausa tras N fallos seguidos: 0 hasta el umbral, luego exponencial"""
+    if consecutive_failures < CIRCUIT_FAILURE_THRESHOLD:
+        return 0.0
+    exponent = min(consecutive_failures - CIRCUIT_FAILURE_THRESHOLD, 32)
+    return float(min(CIRCUIT_MAX_BACKOFF_SECS, CIRCUIT_BASE_BACKOFF_SECS * 2 ** exponent))
+
+
+def record_fetch(conn: sqlite3.Connection, source_id: int, latency: float = None,
+                 error: str = None, now: float = None) -> float:
+    """Registra el resultado de una descarga y retorna la pausa del circuit breaker.
+
+    Un éxito cierra el circuito; cada fallo seguido a partir de
+    CIRCUIT_FAILURE_THRESHOLD duplica la pausa hasta CIRCUIT_MAX_BACKOFF_SECS.
+    """
+    now = now or time.time()
+    latency_ms = latency * 1000 if latency is not None else None
+    row = conn.execute(
+        "SELECT consecutive_failures, avg_latency_ms FROM source_health WHERE source_id = ?",
+        (int(source_id),)
+    ).fetchone()
+    failures, avg_latency = row if row else (0, None)
+    if latency_ms is not None:
+        avg_latency = (latency_ms if avg_latency is None
+                       else LATENCY_EWMA_ALPHA * latency_ms + (1 - LATENCY_EWMA_ALPHA) * avg_latency)
+    failures = failures + 1 if error else 0
+    backoff = circuit_backoff(failures)
+    conn.execute("""
+    INSERT INTO source_health (source_id, consecutive_failures, last_latency_ms, avg_latency_ms,
+                               last_error, last_success_at, last_failure_at, open_until)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(source_id) DO UPDATE SET
+        consecutive_failures = excluded.consecutive_failures,
+        last_latency_ms = excluded.last_latency_ms,
+        avg_latency_ms = excluded.avg_latency_ms,
+        last_error = COALESCE(excluded.last_error, last_error),
+        last_success_at = COALESCE(excluded.last_success_at, last_success_at),
+        last_failure_at = COALESCE(excluded.last_failure_at, last_failure_at),
+        open_until = excluded.open_until
+    """, (int(source_id), failures, latency_ms, avg_latency, error,
+          None if error else now, now if error else None, now + backoff if backoff else None))
+    conn.commit()
+    return backoff
+
+
+def open_circuits(conn: sqlite3.Connection, now: float = None) -> set:
+    """ids de las fuentes con el circuito abierto (en pausa hasta `open_until`)"""
+    now = now or time.time()
+    return {row[0] for row in conn.execute(
+        "SELECT source_id FROM source_health WHERE open_until > ?", (now,)
+    )}
+
+
+def get_source_health(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Estado de todas las fuentes, para la pestaña de Fuentes"""
+    return pd.read_sql_query("SELECT * FROM source_health", conn)
@@ -0,0 +1,640 @@
+"""
+Motor de traducción compartido
+Caché persistente, envío por lotes y límite de tasa con token bucket
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from classification import classify_article
+from db_pool import connect
+
+# Configuración (sobrescribible por variables de entorno)
+DEFAULT_DB_PATH = "cti_platform.db"
+CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "50000"))
+CACHE_LRU_SIZE = int(os.getenv("TRANSLATION_CACHE_LRU_SIZE", "4096"))
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_RATE = float(os.getenv("TRANSLATION_RATE", "2"))      # peticiones por segundo
+TRANSLATION_BURST = int(os.getenv("TRANSLATION_BURST", "5"))
+BATCH_MAX_CHARS = 4500  # GoogleTranslator rechaza textos de más de 5000 caracteres
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espacios para que variaciones triviales compartan entrada"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    """Caché de dos niveles: LRU en memoria delante de una tabla SQLite.
+
+    La clave es (hash del texto normalizado, idioma origen, idioma destino).
+    Cuando la tabla supera `max_entries` se eliminan las entradas usadas
+    hace más tiempo.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 lru_size: int = CACHE_LRU_SIZE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.reset_stats()
+        self.init_table()
+
+    def get_connection(self):
+        return connect(self.db_path)
+
+    def init_table(self):
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS translation_cache (
+                text_hash TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text_hash, source_lang, target_lang)
+            )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translation_cache_last_used "
+                "ON translation_cache(last_used)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def snapshot_stats(self) -> dict:
+        """Copia de los contadores, para medir un tramo con `stats_summary(since=...)`"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _hits_total(self, since: dict = None) -> tuple:
+        stats = self.snapshot_stats()
+        since = since or {}
+        delta = {name: value - since.get(name, 0) for name, value in stats.items()}
+        hits = delta['memory_hits'] + delta['db_hits']
+        return hits, hits + delta['misses']
+
+    def hit_rate(self, since: dict = None) -> float:
+        hits, total = self._hits_total(since)
+        return hits / total if total else 0.0
+
+    def stats_summary(self, since: dict = None) -> str:
+        """Aciertos desde `reset_stats`, o desde la copia `since` de `snapshot_stats`"""
+        hits, total = self._hits_total(since)
+        rate = hits / total if total else 0.0
+        return f"caché de traducción: {hits}/{total} aciertos ({rate:.0%})"
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, text: str, source_lang: str, target_lang: str):
+        """Retorna la traducción en caché o None"""
+        return self.get_many([text], source_lang, target_lang).get(0)
+
+    def put(self, text: str, source_lang: str, target_lang: str, translated: str):
+        self.put_many([(text, translated)], source_lang, target_lang)
+
+    def get_many(self, texts: List[str], source_lang: str, target_lang: str) -> Dict[int, str]:
+        """Busca varias traducciones con una sola conexión. Retorna {índice: traducción}"""
+        found, pending = {}, []
+        with self._lock:
+            for idx, text in enumerate(texts):
+                key = (text_hash(text), source_lang, target_lang)
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    found[idx] = self._lru[key]
+                else:
+                    pending.append((idx, key))
+        if not pending:
+            return found
+
+        conn = self.get_connection()
+        try:
+            rows = {}
+            for idx, key in pending:
+                row = conn.execute(
+                    "SELECT translated FROM translation_cache "
+                    "WHERE text_hash = ? AND source_lang = ? AND target_lang = ?",
+                    key
+                ).fetchone()
+                if row:
+                    rows[idx] = (key, row[0])
+            if rows:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE translation_cache SET last_used = ? "
+                    "WHERE text_hash = ? AND source_lang = ? AND target_lang = ?",
+                    [(now, *key) for key, _ in rows.values()]
+                )
+                conn.commit()
+        finally:
+            conn.close()
+
+        with self._lock:
+            for idx, key in pending:
+                if idx in rows:
+                    self.stats['db_hits'] += 1
+                    self._remember(key, rows[idx][1])
+                    found[idx] = rows[idx][1]
+                else:
+                    self.stats['misses'] += 1
+        return found
+
+    def put_many(self, items: List[tuple], source_lang: str, target_lang: str):
+        """Guarda varias traducciones (texto, traducción) en una transacción"""
+        if not items:
+            return
+        now = time.time()
+        rows = [(text_hash(text), source_lang, target_lang, translated, now)
+                for text, translated in items]
+        with self._lock:
+            for key_hash, src, tgt, translated, _ in rows:
+                self._remember((key_hash, src, tgt), translated)
+            self._writes_since_evict += len(rows)
+            evict = self._writes_since_evict >= 100
+            if evict:
+                self._writes_since_evict = 0
+
+        conn = self.get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translation_cache "
+                "(text_hash, source_lang, target_lang, translated, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            if evict:
+                self._evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn):
+        """Eliminar las entradas menos usadas si se superó el tamaño máximo"""
+        count = conn.execute("SELECT COUNT(*) FROM translation_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM translation_cache WHERE rowid IN ("
+                "SELECT rowid FROM translation_cache ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_translation_cache(db_path: str = DEFAULT_DB_PATH) -> TranslationCache:
+    """Caché compartida por proceso (sobrevive a los reruns de Streamlit)"""
+    with _caches_lock:
+        if db_path not in _caches:
+            _caches[db_path] = TranslationCache(db_path)
+        return _caches[db_path]
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` peticiones por segundo con ráfagas de `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchMismatchError(Exception):
+    """El servicio devolvió un número de fragmentos distinto al enviado"""
+
+
+class GoogleBackend:
+    """Traduce varios fragmentos en una sola petición a Google Translate.
+
+    Los fragmentos se unen con un separador que el traductor conserva; si la
+    respuesta no se puede dividir en la misma cantidad de partes se lanza
+    BatchMismatchError y el motor reintenta fragmento a fragmento.
+    """
+
+    separator = "\n[#]\n"
+    split_pattern = re.compile(r"\s*\[\s*#\s*\]\s*")
+    max_chars = BATCH_MAX_CHARS
+
+    def __init__(self, source: str = 'auto', target: str = 'es'):
+        self.source = source
+        self.target = target
+
+    def translate_chunk(self, texts: List[str]) -> List[str]:
+        from deep_translator import GoogleTranslator
+        # Una instancia por petición: GoogleTranslator no es seguro entre hilos
+        translator = GoogleTranslator(source=self.source, target=self.target)
+        if len(texts) == 1:
+            return [translator.translate(texts[0])]
+        result = translator.translate(self.separator.join(texts)) or ''
+        parts = self.split_pattern.split(result.strip())
+        if len(parts) != len(texts):
+            raise BatchMismatchError(f"{len(texts)} enviados, {len(parts)} recibidos")
+        return parts
+
+
+class LocalBackend:
+    """Backend local sin red para pruebas y benchmarks.
+
+    Devuelve el mismo texto tras una latencia simulada por petición.
+    """
+
+    max_chars = BATCH_MAX_CHARS
+
+    def __init__(self, source: str = 'auto', target: str = 'es', latency: float = 0.0):
+        self.source = source
+        self.target = target
+        self.latency = latency
+
+    def translate_chunk(self, texts: List[str]) -> List[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        return list(texts)
+
+
+BACKENDS = {
+    'google': GoogleBackend,
+    'local': LocalBackend,
+}
+
+
+class TranslationEngine:
+    """Motor de traducción reutilizable.
+
+    - Consulta la caché antes de ir a la red
+    - Agrupa muchos fragmentos por petición (hasta `max_chars`)
+    - Limita la tasa con un token bucket en lugar de pausas fijas
+    - Ante errores (p. ej. HTTP 429) reduce la tasa a la mitad y espera con
+      backoff exponencial; con cada éxito la recupera gradualmente
+    """
+
+    max_retries = 3
+    base_backoff = 1.0
+    max_backoff = 30.0
+
+    def __init__(self, cache: TranslationCache, backend=None, rate: float = TRANSLATION_RATE,
+                 burst: int = TRANSLATION_BURST):
+        self.cache = cache
+        self.backend = backend or BACKENDS.get(TRANSLATION_BACKEND, GoogleBackend)()
+        self.base_rate = rate
+        self.min_rate = rate / 8
+        self.bucket = TokenBucket(rate, burst)
+        self.requests_sent = 0
+
+    def _on_success(self):
+        with self.bucket._lock:
+            self.bucket.rate = min(self.base_rate, self.bucket.rate + self.base_rate * 0.1)
+
+    def _on_throttle(self, attempt: int):
+        with self.bucket._lock:
+            self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+        time.sleep(min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _send(self, chunk: List[str]) -> List[str]:
+        """Una petición con límite de tasa y reintentos"""
+        for attempt in range(self.max_retries):
+            self.bucket.acquire()
+            try:
+                self.requests_sent += 1
+                result = self.backend.translate_chunk(chunk)
+                self._on_success()
+                return result
+            except BatchMismatchError:
+                raise
+            except Exception:
+                if attempt == self.max_retries - 1:
+                    raise
+                self._on_throttle(attempt)
+
+    def _chunks(self, texts: List[str]):
+        chunk, size = [], 0
+        for text in texts:
+            if chunk and size + len(text) > self.backend.max_chars:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(text)
+            size += len(text) + 5
+        if chunk:
+            yield chunk
+
+    def translate_many(self, texts: List[str], fallback: bool = True) -> List[str]:
+        """Traduce una lista de textos.
+
+        Si un texto no se puede traducir se devuelve el original, o None
+        cuando `fallback` es False.
+        """
+        results = list(texts)
+        work = [(idx, text) for idx, text in enumerate(texts) if text and text.strip()]
+        if not work:
+            return results
+
+        cached = self.cache.get_many([text for _, text in work], self.backend.source,
+                                     self.backend.target)
+        pending = {}
+        for pos, (idx, text) in enumerate(work):
+            if pos in cached:
+                results[idx] = cached[pos]
+            else:
+                # Textos repetidos en el lote se traducen una sola vez
+                pending.setdefault(normalize_text(text), []).append(idx)
+
+        translated = []
+        for chunk in self._chunks([texts[idxs[0]] for idxs in pending.values()]):
+            try:
+                outputs = self._send(chunk)
+            except BatchMismatchError:
+                outputs = []
+                for text in chunk:
+                    try:
+                        outputs.append(self._send([text])[0])
+                    except Exception:
+                        outputs.append(None)
+            except Exception:
+                outputs = [None] * len(chunk)
+            for text, output in zip(chunk, outputs):
+                if output:
+                    translated.append((text, output))
+                for idx in pending[normalize_text(text)]:
+                    if output or not fallback:
+                        results[idx] = output or None
+
+        self.cache.put_many(translated, self.backend.source, self.backend.target)
+        return results
+
+    def translate(self, text: str) -> str:
+        return self.translate_many([text])[0]
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_translation_engine(db_path: str = DEFAULT_DB_PATH) -> TranslationEngine:
+    """Motor compartido por proceso, con su caché y su token bucket"""
+    with _engines_lock:
+        if db_path not in _engines:
+            _engines[db_path] = TranslationEngine(get_translation_cache(db_path))
+        return _engines[db_path]
+
+
+# Caracteres a traducir por campo de artículo: título, resumen, contenido
+ARTICLE_FIELD_LIMITS = (500, 500, 1000)
+TRANSLATION_MAX_ATTEMPTS = 3
+
+
+def ensure_translation_columns(conn: sqlite3.Connection):
+    """Agrega a `articles` las columnas de la cola de traducción si faltan"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(articles)")}
+    if 'translation_status' not in columns:
+        # Los artículos existentes ya se guardaron traducidos
+        conn.execute("ALTER TABLE articles ADD COLUMN translation_status TEXT DEFAULT 'done'")
+    if 'translation_attempts' not in columns:
+        conn.execute("ALTER TABLE articles ADD COLUMN translation_attempts INTEGER DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_articles_translation_pending "
+        "ON articles(id) WHERE translation_status = 'pending'"
+    )
+    conn.commit()
+
+
+def translate_article_fields(engine: TranslationEngine, rows: List[tuple],
+                             limits: tuple = ARTICLE_FIELD_LIMITS) -> List[tuple]:
+    """Traduce (título, resumen, contenido) de varios artículos en lote.
+
+    Un campo vacío o que el servicio devuelve sin cambios conserva el texto
+    original completo; un campo que no se pudo traducir queda en None.
+    """
+    snippets = [text[:limit] if text else text
+                for row in rows for text, limit in zip(row, limits)]
+    translated = engine.translate_many(snippets, fallback=False)
+    results = []
+    for i, row in enumerate(rows):
+        fields = []
+        for j, text in enumerate(row):
+            snippet, result = snippets[i * 3 + j], translated[i * 3 + j]
+            if not snippet or not snippet.strip() or result == snippet:
+                fields.append(text)
+            else:
+                fields.append(result)
+        results.append(tuple(fields))
+    return results
+
+
+class TranslationWorker(threading.Thread):
+    """Traduce en segundo plano los artículos con translation_status = 'pending'.
+
+    La ingesta guarda los artículos en su idioma original para que aparezcan
+    en el feed de inmediato; este hilo los traduce y los actualiza en su
+    lugar (el trigger `articles_au` mantiene sincronizado el índice FTS).
+    Si recibe `report`, le pasa un resumen de cada lote con los aciertos de
+    caché de ese lote.
+    """
+
+    batch_size = 20
+    idle_interval = 10.0
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, engine: TranslationEngine = None,
+                 report: Callable[[str], None] = None):
+        super().__init__(name="translation-worker", daemon=True)
+        self.db_path = db_path
+        self.engine = engine or get_translation_engine(db_path)
+        self.report = report
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+
+    def get_connection(self):
+        return connect(self.db_path)
+
+    def wake(self):
+        """Avisar que hay artículos nuevos pendientes"""
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def pending_count(self) -> int:
+        conn = self.get_connection()
+        try:
+            return conn.execute(
+                "SELECT COUNT(*) FROM articles WHERE translation_status = 'pending'"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def process_batch(self) -> int:
+        """Traduce un lote de pendientes. Retorna cuántos se completaron"""
+        conn = self.get_connection()
+        try:
+            # Cada artículo conserva su propio texto: los campos idénticos entre
+            # fuentes (casi duplicados) salen de la caché de traducción
+            rows = conn.execute(
+                "SELECT id, title, summary, content, translation_attempts FROM articles "
+                "WHERE translation_status = 'pending' ORDER BY id DESC LIMIT ?",
+                (self.batch_size,)
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return 0
+
+        # Sin conexión abierta mientras se espera a la red
+        stats_before = self.engine.cache.snapshot_stats()
+        translations = translate_article_fields(self.engine, [row[1:4] for row in rows])
+
+        done = 0
+        conn = self.get_connection()
+        try:
+            for row, fields in zip(rows, translations):
+                article_id, attempts = row[0], (row[4] or 0) + 1
+                if None in fields:
+                    status = 'failed' if attempts >= TRANSLATION_MAX_ATTEMPTS else 'pending'
+                    conn.execute(
+                        "UPDATE articles SET translation_status = ?, translation_attempts = ? "
+                        "WHERE id = ?",
+                        (status, attempts, article_id)
+                    )
+                    continue
+                # Reclasificar sobre el texto que se muestra
+                title, summary, content = fields
+                conn.execute(
+                    "UPDATE articles SET title = ?, summary = ?, content = ?, "
+                    "translation_status = 'done', translation_attempts = ?, "
+                    "severity = ?, threat_type = ? WHERE id = ?",
+                    (*fields, attempts, *classify_article(title, content, summary), article_id)
+                )
+                done += 1
+            conn.commit()
+        finally:
+            conn.close()
+        if self.report:
+            self.report(f"🌐 Traducidos {done}/{len(rows)} artículos · "
+                        f"{self.engine.cache.stats_summary(since=stats_before)}")
+        return done
+
+    def drain(self) -> int:
+        """Procesa la cola hasta vaciarla (o hasta que un lote falle por completo)"""
+        total = 0
+        while True:
+            done = self.process_batch()
+            if not done:
+                return total
+            total += done
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                done = self.process_batch()
+            except sqlite3.Error:
+                done = 0
+            if not done:
+                self._wake_event.wait(self.idle_interval)
+                self._wake_event.clear()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def start_translation_worker(db_path: str = DEFAULT_DB_PATH,
+                             report: Callable[[str], None] = None) -> TranslationWorker:
+    """Inicia (una sola vez por proceso) el hilo de traducción en segundo plano"""
+    with _workers_lock:
+        worker = _workers.get(db_path)
+        if worker is None or not worker.is_alive():
+            worker = TranslationWorker(db_path, report=report)
+            worker.start()
+            _workers[db_path] = worker
+        return worker
+
+
+def wake_translation_worker(db_path: str = DEFAULT_DB_PATH):
+    """Despierta el hilo de traducción si está corriendo en este proceso"""
+    worker = _workers.get(db_path)
+    if worker is not None:
+        worker.wake()
+
+
+def benchmark(n_articles: int = 200, latency: float = 0.2):
+    """Compara el flujo anterior (3 llamadas + pausa por artículo) con el motor"""
+    import json
+    import tempfile
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "articles.json"),
+              encoding="utf-8") as f:
+        fixtures = json.load(f)
+    snippets = []
+    for i in range(n_articles):
+        art = fixtures[i % len(fixtures)]
+        snippets.extend([f"{art['title']} #{i}", f"{art['content'][:500]} #{i}",
+                         f"{art['content'][:1000]} #{i}"])
+
+    # Flujo anterior: una petición por campo seguida de time.sleep(0.5)
+    legacy_secs = len(snippets) * (latency + 0.5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = TranslationEngine(TranslationCache(os.path.join(tmp, "bench.db")),
+                                   backend=LocalBackend(latency=latency))
+        start = time.perf_counter()
+        for i in range(0, len(snippets), 3):
+            engine.translate_many(snippets[i:i + 3])
+        per_article_secs = time.perf_counter() - start
+
+        engine = TranslationEngine(TranslationCache(os.path.join(tmp, "bench2.db")),
+                                   backend=LocalBackend(latency=latency))
+        start = time.perf_counter()
+        engine.translate_many(snippets)
+        batched_secs = time.perf_counter() - start
+        batched_requests = engine.requests_sent
+
+    print(f"Artículos: {n_articles} · latencia simulada: {latency}s · tasa: {TRANSLATION_RATE}/s")
+    print(f"  Flujo anterior (estimado): {legacy_secs:.1f}s · {n_articles / legacy_secs:.2f} art/s")
+    print(f"  Motor, lote por artículo:  {per_article_secs:.1f}s · {n_articles / per_article_secs:.2f} art/s")
+    print(f"  Motor, lote por feed:      {batched_secs:.1f}s · {n_articles / batched_secs:.2f} art/s "
+          f"({batched_requests} peticiones)")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        benchmark(*(int(a) for a in sys.argv[2:3]))
+    else:
+        print("Uso: python translation.py benchmark [N_ARTICULOS]")
@@ -0,0 +1,183 @@
+"""
+Watchlist de IOCs del SOC
+Cada artículo nuevo se compara al ingerirse y se puede re-cazar todo el histórico
+"""
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from ioc_extraction import extract_many, parse_stored_ioc
+from query_cache import read_generations
+
+WATCHLIST_BATCH_SIZE = 2000   # artículos por lote en la re-caza
+
+# Lecturas completas deliberadas (query_plans.py no las marca): la carga en
+# memoria, que solo se repite cuando cambia la generación de la watchlist, y
+# el informe por indicador, que parte de las coincidencias y no de la watchlist
+LOAD_SQL = "SELECT id, value, type FROM watchlist"
+HITS_PER_INDICATOR_SQL = """
+    SELECT w.value, w.type, w.label, h.articles, h.last_found
+    FROM (SELECT watch_id, COUNT(*) AS articles, MAX(found_at) AS last_found
+          FROM watchlist_hits GROUP BY watch_id) h
+    JOIN watchlist w ON w.id = h.watch_id
+    ORDER BY h.articles DESC, w.value
+    """
+
+
+def ensure_watchlist_tables(conn: sqlite3.Connection):
+    """Crea `watchlist` (indicadores vigilados) y `watchlist_hits` (coincidencias)"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS watchlist (
+        id INTEGER PRIMARY KEY,
+        value TEXT NOT NULL UNIQUE,
+        type TEXT NOT NULL,
+        label TEXT,
+        added_at REAL NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS watchlist_hits (
+        watch_id INTEGER NOT NULL,
+        article_id INTEGER NOT NULL,
+        found_at REAL NOT NULL,
+        PRIMARY KEY (watch_id, article_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_hits_article ON watchlist_hits(article_id)")
+    conn.commit()
+
+
+def add_indicators(conn: sqlite3.Connection, values: Iterable[str], label: str = None) -> Tuple[int, List[str]]:
+    """Agrega indicadores a la watchlist (acepta valores defangeados).
+
+    Retorna (agregados, rechazados): los rechazados no se reconocen como
+    IP, dominio, CVE o hash; los repetidos no cuentan como agregados.
+    """
+    rows, rejected = [], []
+    now = time.time()
+    for raw in values:
+        if not raw.strip() or raw.lstrip().startswith('#'):
+            continue
+        ioc = parse_stored_ioc(raw)
+        if ioc is None:
+            rejected.append(raw.strip())
+        else:
+            rows.append((ioc.value, ioc.type, label, now))
+    with conn:
+        # rowcount y no total_changes: este cuenta también el trigger de generación
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO watchlist (value, type, label, added_at) VALUES (?, ?, ?, ?)", rows
+        )
+        return max(cursor.rowcount, 0), rejected
+
+
+class Watchlist:
+    """Indicadores vigilados en memoria: un conjunto por tipo de IOC.
+
+    Los conjuntos de Python ya son tablas hash exactas; con 100k
+    indicadores ocupan unos pocos MB, así que no hace falta un filtro de
+    Bloom (que además daría falsos positivos). Se recarga solo cuando la
+    tabla cambia: un trigger sube su contador en `data_generation` (ver
+    query_cache.py), que se lee con una búsqueda por clave.
+    """
+
+    def __init__(self):
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self._generation = None
+
+    def refresh(self, conn: sqlite3.Connection):
+        generation = read_generations(conn).get('watchlist')
+        if generation is not None and generation == self._generation:
+            return
+        by_type = {}
+        for watch_id, value, ioc_type in conn.execute(LOAD_SQL):
+            by_type.setdefault(ioc_type, {})[value] = watch_id
+        self.by_type, self._generation = by_type, generation
+
+    def __len__(self):
+        return sum(len(values) for values in self.by_type.values())
+
+    def match(self, iocs) -> List[int]:
+        """Ids de la watchlist presentes entre `iocs` (objetos IOC)"""
+        return list(dict.fromkeys(
+            self.by_type[ioc.type][ioc.value] for ioc in iocs
+            if ioc.value in self.by_type.get(ioc.type, ())
+        ))
+
+    def match_stored(self, stored_iocs: str) -> List[int]:
+        """Como `match`, para el texto separado por comas de `articles.iocs`"""
+        parsed = (parse_stored_ioc(raw) for raw in (stored_iocs or '').split(','))
+        return self.match(ioc for ioc in parsed if ioc)
+
+
+def record_hits(conn: sqlite3.Connection, article_id: int, watch_ids: Iterable[int]):
+    """Guarda las coincidencias de un artículo (no hace commit)"""
+    conn.executemany(
+        "INSERT OR IGNORE INTO watchlist_hits (watch_id, article_id, found_at) VALUES (?, ?, ?)",
+        [(watch_id, article_id, time.time()) for watch_id in watch_ids]
+    )
+
+
+def retro_hunt(conn: sqlite3.Connection, watchlist: Watchlist, workers: int = 1,
+               batch_size: int = WATCHLIST_BATCH_SIZE) -> int:
+    """Compara todo el histórico con la watchlist y guarda las coincidencias.
+
+    Se vuelven a extraer los IOCs del texto sin límite por artículo (la
+    columna `iocs` guarda como mucho IOC_MAX_PER_ARTICLE) y se suman los
+    ya guardados, que salieron del contenido original sin recortar.
+    Retorna cuántas coincidencias nuevas se registraron.
+    """
+    watchlist.refresh(conn)
+    if not len(watchlist):
+        return 0
+    before, last_id = conn.total_changes, 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, title, content, iocs FROM articles WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return conn.total_changes - before
+        extracted = extract_many((f"{title} {content or ''}" for _, title, content, _ in rows),
+                                 workers=workers, limit=0)
+        with conn:
+            for (article_id, _, _, stored), iocs in zip(rows, extracted):
+                watch_ids = watchlist.match(iocs) + watchlist.match_stored(stored)
+                if watch_ids:
+                    record_hits(conn, article_id, watch_ids)
+        last_id = rows[-1][0]
+
+
+def hits_per_indicator(conn: sqlite3.Connection, limit: int = None) -> List[tuple]:
+    """(valor, tipo, etiqueta, artículos, última coincidencia) de los indicadores con coincidencias"""
+    query = HITS_PER_INDICATOR_SQL
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return conn.execute(query).fetchall()
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    from database import CTIDatabase
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "load" and len(sys.argv) > 2:
+        db = CTIDatabase(sys.argv[3] if len(sys.argv) > 3 else "cti_platform.db")
+        with open(sys.argv[2], encoding='utf-8') as f:
+            added, rejected = db.add_watchlist_indicators(f, label=os.path.basename(sys.argv[2]))
+        print(f"Indicadores agregados: {added} · rechazados: {len(rejected)}")
+        for value in rejected[:20]:
+            print(f"  ✗ {value}")
+    elif command == "hunt":
+        db = CTIDatabase(sys.argv[2] if len(sys.argv) > 2 else "cti_platform.db")
+        workers = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+        start = time.perf_counter()
+        new_hits = db.retro_hunt(workers)
+        print(f"Coincidencias nuevas: {new_hits} ({time.perf_counter() - start:.1f}s)")
+        for value, ioc_type, label, articles, _ in db.get_watchlist_hits():
+            print(f"  {articles:>5}  {ioc_type:<7} {value}  [{label or '-'}]")
+    else:
+        print("Uso: python watchlist.py load ARCHIVO [RUTA_BD]   # un indicador por línea")
+        print("     python watchlist.py hunt [RUTA_BD] [PROCESOS]  # re-caza sobre el histórico")